@@ -0,0 +1,133 @@
+# Guy
+# animation.py
+# Copyright 2025, Jonathan Koren
+# Licensed under the Gnu Public License v3
+#
+# Tweens a Chernoff face from one look to another: the eyebrows turn, the
+# pupils slide, the nose grows or shrinks, and the mouth bends. Every frame
+# moves the shapes the face already has, with Face.render(), rather than
+# making new ones.
+
+from adafruit_ticks import ticks_diff, ticks_ms
+
+FRAMES = 10 # frames from one face to the next
+FRAME_MS = 50 # 20 frames a second, so a tween takes half a second
+
+# A RoundRect can't be resized, so every nose size is a new shape. The nose
+# only changes this many times during a tween, and Face keeps them in its
+# pools for next time.
+NOSE_STEPS = 3
+
+def tween(start, end, frame, frames):
+    '''Where a value is `frame` frames of `frames` from start to end.'''
+    if frame >= frames:
+        return end
+    return start + (end - start) * frame // frames
+
+class Pose:
+    '''The parts of a face that can be tweened, as they are when this is
+    made.'''
+    def __init__(self, face):
+        self.angles = [eyebrow.angle for eyebrow in face.eyebrows]
+        self.pupils = [(pupil.x, pupil.y) for pupil in face.pupils]
+        self.nose = (face.nose.width, face.nose.height)
+        self.mouth = face.mouth.points
+        if self.mouth is None:
+            self.mouth = face.mouth.outline()
+
+class Animator:
+    '''Tweens a face over `frames` frames, `frame_ms` apart. Each frame is
+    picked by how long it's been since the tween started, so when drawing one
+    takes longer than frame_ms, the frames it ran into are dropped instead of
+    the whole tween falling behind.'''
+    def __init__(self, face, frames=FRAMES, frame_ms=FRAME_MS):
+        self.face = face
+        self.frames = frames
+        self.frame_ms = frame_ms
+        self.start_pose = None
+        self.end_pose = None
+        self.started = 0
+        self.frame = 0 # the last frame drawn
+        self.drawn = 0
+        self.dropped = 0
+        self.worst_ms = 0
+
+    def running(self):
+        return self.end_pose is not None
+
+    def start(self, pose):
+        '''Tweens from `pose` to how the face is set up now. Make the pose
+        before changing the face. The face is put back the way the pose has
+        it, which is still what's on the screen.'''
+        self.face.update()
+        self.start_pose = pose
+        self.end_pose = Pose(self.face)
+        self.started = ticks_ms()
+        self.frame = 0
+        self.drawn = 0
+        self.dropped = 0
+        self.worst_ms = 0
+        self.apply(0)
+
+    def step(self):
+        '''Draws the frame that's due now. Returns the seconds until the next
+        one, or None once the tween is done.'''
+        if not self.running():
+            return None
+        began = ticks_ms()
+        frame = max(self.frame + 1, ticks_diff(began, self.started) // self.frame_ms)
+        if frame >= self.frames:
+            # only the frames skipped before the end were dropped
+            self.dropped += self.frames - 1 - self.frame
+            self.finish()
+            return None
+
+        self.dropped += frame - self.frame - 1
+        self.apply(frame)
+        self.face.render(update=False)
+        self.frame = frame
+        self.drawn += 1
+
+        now = ticks_ms()
+        self.worst_ms = max(self.worst_ms, ticks_diff(now, began))
+        wait_ms = (frame + 1) * self.frame_ms - ticks_diff(now, self.started)
+        return max(0, wait_ms) / 1000
+
+    def finish(self):
+        '''Jumps to the end of the tween.'''
+        if not self.running():
+            return
+        self.apply(self.frames)
+        self.face.mouth.points = None
+        self.end_pose = None
+        self.face.render()
+        print(f'ANIMATION: {self.drawn} frames, {self.dropped} dropped, worst {self.worst_ms} ms')
+
+    def cancel(self):
+        '''Ends the tween without drawing it, for when the face's shapes are
+        about to be released. The face is left set up for its end pose, which
+        the next render() draws.'''
+        if not self.running():
+            return
+        self.apply(self.frames)
+        self.face.mouth.points = None
+        self.end_pose = None
+
+    def apply(self, frame):
+        '''Sets the face to `frame` frames into the tween.'''
+        (face, start, end, frames) = (self.face, self.start_pose, self.end_pose, self.frames)
+        for i in range(len(face.eyebrows)):
+            face.eyebrows[i].angle = tween(start.angles[i], end.angles[i], frame, frames)
+        for i in range(len(face.pupils)):
+            face.pupils[i].x = tween(start.pupils[i][0], end.pupils[i][0], frame, frames)
+            face.pupils[i].y = tween(start.pupils[i][1], end.pupils[i][1], frame, frames)
+
+        nose_frame = frame * NOSE_STEPS // frames
+        face.nose.width = tween(start.nose[0], end.nose[0], nose_frame, NOSE_STEPS)
+        face.nose.height = tween(start.nose[1], end.nose[1], nose_frame, NOSE_STEPS)
+
+        # Mouths that aren't an arc or a line, like ANGRY's, change at once.
+        face.mouth.points = None
+        if start.mouth is not None and end.mouth is not None and len(start.mouth) == len(end.mouth):
+            face.mouth.points = [(tween(p[0], q[0], frame, frames), tween(p[1], q[1], frame, frames))
+                                 for (p, q) in zip(start.mouth, end.mouth)]
@@ -7,16 +7,24 @@ import sys
 
 CIRCUIT_PYTHON = 'CircuitPython' in sys.version
 
+# Faces are drawn with displayio on the ESP32 and with raster.py (NumPy) on a
+# computer. Without either, drawing just prints what would have been drawn.
+HAVE_SHAPES = True
 if CIRCUIT_PYTHON:
-    from adafruit_display_shapes.arc import Arc
+    import displayio
     from adafruit_display_shapes.circle import Circle
     from adafruit_display_shapes.filled_polygon import FilledPolygon
     from adafruit_display_shapes.line import Line
     from adafruit_display_shapes.roundrect import RoundRect
+else:
+    try:
+        import raster as displayio
+        from raster import Circle, FilledPolygon, Line, RoundRect
+    except ImportError:
+        HAVE_SHAPES = False
 
-from math import pi, sin, cos, atan, radians, pi
-
-from scale import euclid
+from geometry import arc_points, pull_in, rotate
+from memory import mem_free
 
 class Emotion:
     HAPPY = HAPPY_3 = 3
@@ -40,6 +48,39 @@ def reduce(l, s):
         value = l(value, e)
     return value
 
+# Every face shape except the tears is drawn with palette index INK. Index 0 is
+# the transparent background, and index 2 is the fill of an unfilled RoundRect
+# or Circle, so it is transparent too.
+INK = 1
+
+def make_group():
+    '''Makes a group that faces can be drawn into.'''
+    if HAVE_SHAPES:
+        return displayio.Group()
+    return []
+
+def make_palette(color):
+    palette = displayio.Palette(3)
+    palette.make_transparent(0)
+    palette[INK] = color
+    palette.make_transparent(2)
+    return palette
+
+def ink(shape, palette):
+    '''Makes shape draw with palette's INK color, so that recoloring is one
+    palette write instead of a new shape. Circle, RoundRect, and Line are
+    TileGrids whose outline is index 1. Filled polygons and arcs draw their
+    fill with a vectorio polygon.'''
+    if palette is None:
+        return shape
+    polygon = getattr(shape, 'vector_polygon', None)
+    if polygon is not None:
+        polygon.pixel_shader = palette
+        polygon.color_index = INK
+    else:
+        shape.pixel_shader = palette
+    return shape
+
 def make_tear_points(top):
     return [top, (top[0]-5, top[1]+10), (top[0]-10, top[1]+20), (top[0], top[1]+25), (top[0]+10, top[1]+20), (top[0]+5, top[1]+10)]
 
@@ -57,9 +98,21 @@ class Eye:
     def describe(self):
         return f'EYE: center ({self.x}, {self.y}), r={self.radius} stroke: {self.stroke} 0x{self.color:x}'
 
-    def draw(self, displayio_group):
-        if CIRCUIT_PYTHON:
-            displayio_group.append(Circle(x0=self.x, y0=self.y, r=self.radius, fill=self.fill, outline=self.color, stroke=self.stroke))
+    def state(self):
+        return (self.x, self.y, self.radius, self.stroke, self.fill, self.left_tears, self.right_tears)
+
+    def move(self, shapes, previous):
+        '''Moves the already drawn circle if nothing but its center changed.
+        Returns False if it needs to be drawn again.'''
+        if previous[2:] != self.state()[2:] or self.left_tears or self.right_tears:
+            return False
+        shapes[0].x0 = self.x
+        shapes[0].y0 = self.y
+        return True
+
+    def draw(self, displayio_group, palette=None):
+        if HAVE_SHAPES:
+            displayio_group.append(ink(Circle(x0=self.x, y0=self.y, r=self.radius, fill=self.fill, outline=self.color, stroke=self.stroke), palette))
             
             for i in range(self.left_tears):
                 top_x = self.x - self.radius - 10
@@ -89,8 +142,7 @@ class EyeBrow:
         self.height = 2
 
     def _rotate(self, point):
-        return (round((point[0] * cos(radians(self.angle))) - (point[1] * sin(radians(self.angle)))),
-                round((point[0] * sin(radians(self.angle))) + (point[1] * cos(radians(self.angle)))))
+        return rotate(point[0], point[1], self.angle)
 
     def _generate_points(self):
             hh = self.height // 2
@@ -101,16 +153,27 @@ class EyeBrow:
     def describe(self):
         return f'EYEBROW center: {self.x}, {self.y} angle: {self.angle} h: {self.height} w: {self.width} points: {self._generate_points()} stroke: {self.stroke} color: {self.color}'
 
+    def state(self):
+        self.update()
+        return (self.x, self.y, self.angle, self.width, self.height, self.stroke)
+
+    def move(self, shapes, previous):
+        '''Reshapes the already drawn polygon in place.'''
+        if previous[3:] != self.state()[3:]:
+            return False
+        shapes[0].points = self._generate_points()
+        return True
+
     def update(self):
         if self.angle > 30:
             self.angle = 30
         if self.angle < -30:
             self.angle = -30
 
-    def draw(self, displayio_group):
+    def draw(self, displayio_group, palette=None):
         self.update()
-        if CIRCUIT_PYTHON:
-            displayio_group.append(FilledPolygon(points=self._generate_points(), fill=self.color, stroke=self.stroke))
+        if HAVE_SHAPES:
+            displayio_group.append(ink(FilledPolygon(points=self._generate_points(), fill=self.color, stroke=self.stroke), palette))
         else:
             print(self.describe())
 
@@ -119,20 +182,9 @@ def bound_pupil_to_eye(eye, pupil):
     pupil.radius = min(pupil.radius, eye.radius)
 
     # don't let the pupil move past the eye
-    dist_pupil_edge = euclid(eye.x, eye.y, pupil.x, pupil.y) + pupil.radius
-
-    if dist_pupil_edge > eye.radius:
-        overage = dist_pupil_edge - eye.radius
-        angle = pi / 2
-        if pupil.x - eye.x > 0:
-            rat = (pupil.y - eye.y) / (pupil.x - eye.x)
-            angle = atan(rat)
-            pupil.x -= round(cos(angle) * overage)
-        elif eye.x - pupil.x != 0:
-            rat = (pupil.y - eye.y) / (eye.x - pupil.x)
-            angle = atan(rat)
-            pupil.x += round(cos(angle) * overage)
-        pupil.y -= round(sin(angle) * overage)
+    (move_x, move_y) = pull_in(pupil.x - eye.x, pupil.y - eye.y, eye.radius, pupil.radius)
+    pupil.x -= move_x
+    pupil.y -= move_y
 
 class Nose:
     def __init__(self):
@@ -147,15 +199,29 @@ class Nose:
     def describe(self):
         return f'NOSE: x: {self.x} y: {self.y} w: {self.width} h: {self.height} stroke: {self.stroke} 0x{self.color:x} fill: {self.fill}'
 
-    def draw(self, displayio_group):
-        if CIRCUIT_PYTHON:
+    def state(self):
+        return (self.x, self.y, self.width, self.height, self.stroke, self.fill)
+
+    def move(self, shapes, previous):
+        if previous[2:] != self.state()[2:]:
+            return False
+        shapes[0].x = self.x - (self.width // 2)
+        shapes[0].y = self.y - (self.height // 2)
+        return True
+
+    def draw(self, displayio_group, palette=None):
+        if HAVE_SHAPES:
             left = self.x - (self.width // 2)
             top = self.y - (self.height // 2)
             radius = min(self.height, self.width) // 2
-            displayio_group.append(RoundRect(x=left, y=top, width=self.width, height=self.height, r=radius, fill=None, outline=self.color, stroke=self.stroke))
+            displayio_group.append(ink(RoundRect(x=left, y=top, width=self.width, height=self.height, r=radius, fill=None, outline=self.color, stroke=self.stroke), palette))
         else:
             print(self.describe())
 
+# Mouth arc points, relative to the center of the arc. There's only a few
+# arcs, one per emotion and stroke.
+_arc_points = {}
+
 class Mouth:
     def __init__(self):
         self.x = 0
@@ -169,64 +235,122 @@ class Mouth:
         self.emotion = Emotion.NEUTRAL
         self.HALF_WIDTH = 105
         self.NEUTRAL_Y_OFFSET = 100
+        # When set, the mouth is drawn as this polygon instead of by emotion.
+        # animation.py uses it to bend one mouth into another.
+        self.points = None
 
     def describe(self):
         return f'MOUTH: {self.__dict__}'
 
-    def draw(self, displayio_group):
-        if not CIRCUIT_PYTHON:
-            print(self.describe())
-            return
-
-        ###################################
+    def state(self):
+        return (self.x, self.y, self.emotion, self.stroke, self.segments, self.points)
+
+    def move(self, shapes, previous):
+        '''A mouth drawn as one polygon can be reshaped into any other with as
+        many points.'''
+        polygon = self.polygon()
+        if polygon is None or len(shapes) != 1 or getattr(shapes[0], 'vector_polygon', None) is None:
+            return False
+        (points, x, y) = polygon
+        if len(shapes[0].points) != len(points):
+            return False
+        shapes[0].points = points
+        shapes[0].x = x
+        shapes[0].y = y
+        return True
+
+    def arc(self):
+        '''The y, radius, angle, and direction of the arc this emotion is drawn
+        with, or None if it isn't drawn with an arc.'''
         # HAPPY
         if self.emotion == Emotion.HAPPY_3:
-            y = self.y
-            direction = 270
-            arc = 120
-            radius = 100
-            BASE_RADIUS = 100
-            displayio_group.append(Arc(x=self.x, y=y, radius=radius, angle=arc, direction=direction, segments=self.segments, arc_width=self.stroke * 2, fill=self.color))
+            return (self.y, 100, 120, 270)
         elif self.emotion == Emotion.HAPPY_2:
-            y = self.y - 100
-            direction = 270
-            arc = 60
-            radius = 200
-            displayio_group.append(Arc(x=self.x, y=y, radius=radius, angle=arc, direction=direction, segments=self.segments, arc_width=self.stroke * 2, fill=self.color))
+            return (self.y - 100, 200, 60, 270)
         elif self.emotion == Emotion.HAPPY_1:
-            y = self.y - 300
-            direction = 270
-            arc = 30
-            radius = 400
-            displayio_group.append(Arc(x=self.x, y=y, radius=radius, angle=arc, direction=direction, segments=self.segments, arc_width=self.stroke * 2, fill=self.color))
-
-        ####################################
-        # NEUTRAL
+            return (self.y - 300, 400, 30, 270)
         elif self.emotion == Emotion.NEUTRAL:
-            y = self.y + self.NEUTRAL_Y_OFFSET
-            displayio_group.append(Line(x0=self.x - self.HALF_WIDTH, y0=y, x1=self.x + self.HALF_WIDTH, y1=y, color=self.color))
-
-        ####################################
+            return None
         # SAD
         elif self.emotion <= Emotion.SAD_3 or self.emotion <= Emotion.SAD_4:
-            radius = 100
-            y = self.y + (2 * radius)
-            direction = 90
-            arc = 120
-            BASE_RADIUS = 100
-            displayio_group.append(Arc(x=self.x, y=y, radius=radius, angle=arc, direction=direction, segments=self.segments, arc_width=self.stroke * 2, fill=self.color))
+            return (self.y + 200, 100, 120, 90)
         elif self.emotion == Emotion.SAD_2:
-            y = self.y + 300
-            direction = 90
-            arc = 60
-            radius = 200
-            displayio_group.append(Arc(x=self.x, y=y, radius=radius, angle=arc, direction=direction, segments=self.segments, arc_width=self.stroke * 2, fill=self.color))
+            return (self.y + 300, 200, 60, 90)
         elif self.emotion == Emotion.SAD_1:
-            y = self.y + 500
-            direction = 90
-            arc = 30
-            radius = 400
-            displayio_group.append(Arc(x=self.x, y=y, radius=radius, angle=arc, direction=direction, segments=self.segments, arc_width=self.stroke * 2, fill=self.color))
+            return (self.y + 500, 400, 30, 90)
+        return None
+
+    def _arc_points(self, radius, arc, direction):
+        '''The outline of adafruit_display_shapes.arc.Arc, made by
+        geometry.arc_points and remembered for next time.'''
+        key = (radius, arc, direction, self.segments, self.stroke * 2)
+        points = _arc_points.get(key)
+        if points is None:
+            points = arc_points(radius, arc, direction, self.segments, self.stroke * 2)
+            _arc_points[key] = points
+        return points
+
+    def polygon(self):
+        '''The points of the polygon the mouth is drawn as and where it's
+        drawn, or None if it isn't drawn as one.'''
+        if self.points is not None:
+            return (self.points, 0, 0)
+        arc = self.arc()
+        if arc is None:
+            return None
+        (y, radius, angle, direction) = arc
+        return (self._arc_points(radius, angle, direction), self.x, y)
+
+    def outline(self):
+        '''The mouth as a polygon in face coordinates: the top edge from left
+        to right, then the bottom edge back. Mouths with the same segments
+        have the same number of points, so one can be bent into another point
+        by point. None if the mouth is neither an arc nor a line.'''
+        count = self.segments + 1
+        arc = self.arc()
+        if arc is not None:
+            (y, radius, angle, direction) = arc
+            points = self._arc_points(radius, angle, direction)
+            outer = points[:count]
+            inner = points[count:]
+            if outer[0][0] > outer[-1][0]:
+                outer.reverse()
+                inner.reverse()
+            # a smile's center is above it, so its outer edge is the bottom
+            if direction == 270:
+                (top, bottom) = (inner[::-1], outer)
+            else:
+                (top, bottom) = (outer, inner[::-1])
+            return ([(px + self.x, py + y) for (px, py) in top] +
+                    [(px + self.x, py + y) for (px, py) in reversed(bottom)])
+        if self.emotion == Emotion.NEUTRAL:
+            y = self.y + self.NEUTRAL_Y_OFFSET
+            xs = [self.x - self.HALF_WIDTH + (2 * self.HALF_WIDTH * i) // self.segments for i in range(count)]
+            return ([(x, y - self.stroke) for x in xs] +
+                    [(x, y + self.stroke) for x in reversed(xs)])
+        return None
+
+    def draw(self, displayio_group, palette=None):
+        if not HAVE_SHAPES:
+            print(self.describe())
+            return
+
+        ###################################
+        # HAPPY / SAD, or on its way between two mouths
+        polygon = self.polygon()
+        if polygon is not None:
+            # the same shape as adafruit_display_shapes.arc.Arc
+            (points, x, y) = polygon
+            shape = FilledPolygon(points=points, fill=self.color)
+            shape.x = x
+            shape.y = y
+            displayio_group.append(ink(shape, palette))
+
+        ####################################
+        # NEUTRAL
+        elif self.emotion == Emotion.NEUTRAL:
+            y = self.y + self.NEUTRAL_Y_OFFSET
+            displayio_group.append(ink(Line(x0=self.x - self.HALF_WIDTH, y0=y, x1=self.x + self.HALF_WIDTH, y1=y, color=self.color), palette))
 
         ####################################
         # SCARED / ANGRY
@@ -237,17 +361,24 @@ class Mouth:
             y = self.y + self.NEUTRAL_Y_OFFSET
             top = y - (height // 2)
             radius = height // 2
-            displayio_group.append(RoundRect(x=left, y=top, width=width, height=height, r=radius, fill=None, outline=self.color, stroke=self.stroke))
+            displayio_group.append(ink(RoundRect(x=left, y=top, width=width, height=height, r=radius, fill=None, outline=self.color, stroke=self.stroke), palette))
 
             # horiz teeth line
-            displayio_group.append(Line(x0=self.x - self.HALF_WIDTH, y0=y, x1=self.x + self.HALF_WIDTH, y1=y, color=self.color))
+            displayio_group.append(ink(Line(x0=self.x - self.HALF_WIDTH, y0=y, x1=self.x + self.HALF_WIDTH, y1=y, color=self.color), palette))
 
             # vert teeth lines
             NUM_TEETH = 6
             teeth_width = width // NUM_TEETH
             for i in range(1, NUM_TEETH):
                 x = left + (teeth_width * i)
-                displayio_group.append(Line(x0=x, y0=top, x1=x, y1=top + height, color=self.color))
+                displayio_group.append(ink(Line(x0=x, y0=top, x1=x, y1=top + height, color=self.color), palette))
+
+# How many sets of shapes each feature keeps for states it isn't showing, so
+# that going back to one doesn't make new shapes. The least recently shown are
+# let go of first, and all but the last of each when there's less than
+# POOL_MIN_FREE bytes of heap free.
+POOL_SIZE = 6
+POOL_MIN_FREE = 64 * 1024
 
 class Face:
     def __init__(self, diameter):
@@ -260,6 +391,17 @@ class Face:
         self.emotion = None
         self.color = 0xffffff
 
+        # all of the face's shapes share this palette
+        self.palette = make_palette(self.color) if HAVE_SHAPES else None
+
+        # what render() has drawn so far. One layer per feature, in the same
+        # order as features().
+        self.group = None
+        self.layers = []
+        self.drawn = []
+        self.pools = []
+        self.changed = 0
+
         # setup eyes, pupils, and eyebrows
         self.eyes = [ Eye(), Eye() ]
         self.pupils = [ Eye(), Eye() ]
@@ -297,6 +439,11 @@ class Face:
         self.mouth.y = self.y
         self.mouth.direction = 90
 
+    def features(self):
+        return [self.eyes[0], self.pupils[0], self.eyebrows[0],
+                self.eyes[1], self.pupils[1], self.eyebrows[1],
+                self.nose, self.mouth]
+
     def is_complex_emotion(self):
         return self.emotion in [Emotion.SCARED, Emotion.MISCHEVIOUS, Emotion.CONFUSED,
             Emotion.SAD_1, Emotion.SAD_2, Emotion.SAD_3, Emotion.SAD, Emotion.SAD_4]
@@ -329,6 +476,8 @@ class Face:
             self.eyebrows[i].color = self.color
         self.nose.color = self.color
         self.mouth.color = self.color
+        if self.palette is not None:
+            self.palette[INK] = self.color
 
     def update(self):
         if self.emotion is None:
@@ -376,13 +525,95 @@ class Face:
         self.reset_eyebrows()
         self.reset_pupils()
 
+    def render(self, update=True):
+        '''Like draw(), but draws into self.group, which is kept between
+        calls. Only the features that changed since the last render() are
+        moved or drawn again. A feature that can't be moved takes shapes from
+        its pool before it makes new ones. update=False draws the features as
+        they are, without working them out from the emotion first. Returns
+        self.group.'''
+        if update:
+            self.update()
+        if not HAVE_SHAPES:
+            print(self.describe())
+            return None
+
+        features = self.features()
+        if self.group is None:
+            self.group = displayio.Group()
+            self.layers = [displayio.Group() for _ in features]
+            self.drawn = [None] * len(features)
+            self.pools = [[] for _ in features]
+            for layer in self.layers:
+                self.group.append(layer)
+
+        self.changed = 0
+        for i in range(len(features)):
+            state = features[i].state()
+            previous = self.drawn[i]
+            if state == previous:
+                continue
+
+            layer = self.layers[i]
+            if previous is None or len(layer) == 0 or not features[i].move(layer, previous):
+                self.stash(i, previous)
+                if not self.unstash(i, state):
+                    features[i].draw(layer, self.palette)
+            self.drawn[i] = state
+            self.changed += 1
+        return self.group
+
+    def stash(self, i, previous):
+        '''Moves the shapes of feature i out of its layer and into its pool.'''
+        layer = self.layers[i]
+        if previous is None or len(layer) == 0:
+            return
+        shapes = []
+        while len(layer) > 0:
+            shapes.append(layer.pop(0))
+        pool = self.pools[i]
+        pool.append((previous, shapes))
+        if len(pool) > POOL_SIZE:
+            pool.pop(0)
+        free = mem_free()
+        if free is not None and free < POOL_MIN_FREE:
+            self.shrink_pools()
+
+    def shrink_pools(self):
+        '''Lets go of every pooled shape but the ones just stashed.'''
+        for pool in self.pools:
+            while len(pool) > 1:
+                pool.pop(0)
+
+    def unstash(self, i, state):
+        '''Puts shapes from the pool of feature i that are, or can be moved
+        to, its state into its layer. Returns False if none can.'''
+        feature = self.features()[i]
+        pool = self.pools[i]
+        for j in range(len(pool)):
+            (previous, shapes) = pool[j]
+            if previous == state or feature.move(shapes, previous):
+                pool.pop(j)
+                for shape in shapes:
+                    self.layers[i].append(shape)
+                return True
+        return False
+
+    def release(self):
+        '''Forgets every shape render() has made. The next render() starts
+        over.'''
+        self.group = None
+        self.layers = []
+        self.drawn = []
+        self.pools = []
+
     def draw(self, displayio_group):
         self.update()
         for i in range(len(self.eyes)):
-            self.eyes[i].draw(displayio_group)
-            self.pupils[i].draw(displayio_group)
-            self.eyebrows[i].draw(displayio_group)
+            self.eyes[i].draw(displayio_group, self.palette)
+            self.pupils[i].draw(displayio_group, self.palette)
+            self.eyebrows[i].draw(displayio_group, self.palette)
             
-        self.nose.draw(displayio_group)
-        self.mouth.draw(displayio_group)
+        self.nose.draw(displayio_group, self.palette)
+        self.mouth.draw(displayio_group, self.palette)
 
@@ -3,96 +3,62 @@
 # Copyright 2025, Jonathan Koren
 # Licensed under the Gnu Public License v3
 #
-# Find the array `modules` and add your own modules there.
+# The modules are listed by GUY_MODULES in settings.toml. See registry.py.
 
+import boottime
+
+import asyncio
 import os
-import wifi
-import ssl
-import socketpool
-import adafruit_requests
+import traceback
 from adafruit_qualia.graphics import Graphics, Displays
-import displayio
 import time
 
-from weather import Weather
-from opensky import OpenSky
-from faceanimation import FaceAnimation
-
-##############################################################################
-
-def touch_area(x, size):
-    left = size // 4
-    right = left * 3
-    # These are reversed because the touch screen is upsdide down
-    if x < left:
-        return 1
-    elif x > right:
-        return -1
-    else:
-        return 0
+from connections import Connections
+from mainloop import MainLoop
+from registry import load_modules
+boottime.mark('imports')
 
 ##############################################################################
 
 # Connect to network
-wifi.radio.connect(os.getenv("CIRCUITPY_WIFI_SSID"), os.getenv("CIRCUITPY_WIFI_PASSWORD"))
-print(f"Connected to {os.getenv('CIRCUITPY_WIFI_SSID')}")
-
-# Create the face
-graphics = Graphics(Displays.ROUND21, default_bg=0x103260, auto_refresh=True, rotation=180)
-
-next_refresh = 0
-next_touch = 0
-TOUCH_TTL = 1
-ERROR_TIMEOUT = 60
+requests = Connections(os.getenv("CIRCUITPY_WIFI_SSID"), os.getenv("CIRCUITPY_WIFI_PASSWORD"))
+boottime.mark('wifi')
+
+# Create the face. compositor.py refreshes the display once a frame is drawn,
+# rather than after every change.
+graphics = Graphics(Displays.ROUND21, default_bg=0x103260, auto_refresh=False, rotation=180)
+boottime.mark('display')
+
+# Nothing is imported or made until it's first used. The diagnostics module
+# shows the timings of the others.
+modules = load_modules(os.getenv('GUY_MODULES'), graphics.display.width, requests, os.getenv)
+
+# Least recently shown modules let go of their groups when the heap is over
+# GUY_HEAP_BUDGET bytes. See memory.py.
+main_loop = MainLoop(graphics.display, graphics.touch, modules, os.getenv('GUY_HEAP_BUDGET'))
+boottime.mark('modules')
+
+# Errors that get this far, including ones raised by a module's refresh(), are
+# printed and retried after reconnecting. The modules and everything they've
+# fetched are kept. The wait doubles for every error that comes soon after the
+# last one.
+MIN_ERROR_TIMEOUT = 1
+MAX_ERROR_TIMEOUT = 60
+error_timeout = MIN_ERROR_TIMEOUT
 while True:
+    started = time.monotonic()
     try:
-        context = ssl.create_default_context()
-        pool = socketpool.SocketPool(wifi.radio)
-        requests = adafruit_requests.Session(pool, context)
-
-        # Edit this array to add your own modules
-        modules = [ FaceAnimation(graphics.display.width),
-            Weather(os.getenv('WEATHER_URL'), requests, graphics.display.width),
-            OpenSky(os.getenv('OPENSKY_LAT_MIN'), os.getenv('OPENSKY_LAT_MAX'),
-                os.getenv('OPENSKY_LONG_MIN'), os.getenv('OPENSKY_LONG_MAX'),
-                requests, graphics.display.width) ]
-        current_module_idx = 0
-
-        group_caches = [None] * len(modules)
-
-        while True:
-            current_module = modules[current_module_idx]
-
-            ttl = None
-            group = None
-            if graphics.touch.touched and time.time() > next_touch:
-                side = touch_area(graphics.touch.touches[0]['x'], graphics.display.width)
-                print('TOUCH!', side)
-                if side != 0 and len(graphics.touch.touches) > 0:
-                    if side < 0:
-                        current_module_idx -= 1
-                        if current_module_idx < 0:
-                            current_module_idx = len(modules) - 1
-                    elif side > 0:
-                        current_module_idx = (current_module_idx + 1) % len(modules)
-
-                    if group_caches[current_module_idx] is not None:
-                        graphics.display.root_group = group_caches[current_module_idx]
-                    current_module = modules[current_module_idx]
-                    (ttl, group) = current_module.draw(time.time())
-                else:
-                    (ttl, group) = current_module.tap(graphics.touch.touches[0]['x'], graphics.touch.touches[0]['y'])
-
-                next_touch = time.time() + TOUCH_TTL
-            elif time.time() > next_refresh:
-                (ttl, group) = current_module.draw(time.time())
-                group_caches[current_module_idx] = group
-
-            if ttl is not None:
-                graphics.display.root_group = group
-                next_refresh = time.time() + ttl
-
+        asyncio.run(main_loop.run())
 
-    except RuntimeError as e:
+    except Exception as e:
         print(f'caught {e}')
-        time.sleep(ERROR_TIMEOUT)
+        traceback.print_exception(e)
+        if time.monotonic() - started > MAX_ERROR_TIMEOUT:
+            error_timeout = MIN_ERROR_TIMEOUT
+        time.sleep(error_timeout)
+        error_timeout = min(error_timeout * 2, MAX_ERROR_TIMEOUT)
+        try:
+            requests.reconnect()
+        except (RuntimeError, OSError) as e:
+            print(f'reconnect failed: {e}')
+        main_loop.reset()
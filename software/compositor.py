@@ -0,0 +1,84 @@
+# Guy
+# compositor.py
+# Copyright 2025, Jonathan Koren
+# Licensed under the Gnu Public License v3
+#
+# Puts groups on the display. Auto refresh is turned off, so a module can build
+# or change its group in as many steps as it likes without the panel showing
+# it half done. Once it's done, the main loop asks for one refresh, and no more
+# than TARGET_FPS of those happen a second.
+#
+# Every refresh is timed as the diagnostics span `display.refresh`, and a
+# summary is printed every REPORT_MS:
+#
+#   COMPOSITOR: 212 frames in 60s, p50 18 ms, worst 41 ms, 0 late
+
+from adafruit_ticks import ticks_add, ticks_diff, ticks_ms
+
+import boottime
+from diagnostics import recorder
+
+TARGET_FPS = 20 # the same as animation.FRAME_MS
+REPORT_MS = 60 * 1000
+
+class Compositor:
+    def __init__(self, display, target_fps=TARGET_FPS):
+        '''display is a displayio display, or anything with a root_group.
+        Without refresh() it's assumed to show changes as they're made.'''
+        self.display = display
+        self.target_fps = target_fps
+        self.frame_ms = 1000 // target_fps
+        if hasattr(display, 'auto_refresh'):
+            display.auto_refresh = False
+        self.dirty = False # something changed since the last refresh
+        self.last_refresh = ticks_add(ticks_ms(), -self.frame_ms)
+        self.report_start = ticks_ms()
+        self.frames = 0 # since report_start
+        self.late = 0 # refreshes the display skipped to catch up
+
+    def show(self, group):
+        '''Makes group the one that's shown at the next refresh.'''
+        if group is not None and group is not self.display.root_group:
+            self.display.root_group = group
+        self.dirty = True
+
+    def invalidate(self):
+        '''Says that the group being shown has been changed.'''
+        self.dirty = True
+
+    def refresh(self):
+        '''Refreshes the display if anything changed and a frame is due.
+        Returns the seconds until the next frame if something is still
+        waiting to be shown, otherwise None.'''
+        if not self.dirty:
+            return None
+        wait_ms = self.frame_ms - ticks_diff(ticks_ms(), self.last_refresh)
+        if wait_ms > 0:
+            return wait_ms / 1000
+
+        self.last_refresh = ticks_ms()
+        if hasattr(self.display, 'refresh'):
+            with recorder.span('display', 'refresh', log=False):
+                shown = self.display.refresh(target_frames_per_second=self.target_fps,
+                                             minimum_frames_per_second=0)
+            if shown is False:
+                # too long since the last one, try again next frame
+                self.late += 1
+                return self.frame_ms / 1000
+        self.dirty = False
+        self.frames += 1
+        boottime.first_frame()
+        self.report()
+        return None
+
+    def report(self):
+        elapsed = ticks_diff(ticks_ms(), self.report_start)
+        if elapsed < REPORT_MS:
+            return
+        times = recorder.times.get('display.refresh')
+        if times is not None:
+            print(f'COMPOSITOR: {self.frames} frames in {elapsed // 1000}s, '
+                  f'p50 {times.percentile(50)} ms, worst {times.percentile(100)} ms, {self.late} late')
+        self.report_start = ticks_ms()
+        self.frames = 0
+        self.late = 0
@@ -0,0 +1,54 @@
+# Guy
+# connections.py
+# Copyright 2025, Jonathan Koren
+# Licensed under the Gnu Public License v3
+#
+# Owns the WiFi connection, socket pool, SSL context, and requests session for
+# as long as Guy is running. adafruit_requests keeps a socket open per host
+# and reuses it for the next request, so none of them are thrown away unless
+# a request fails.
+
+import adafruit_connection_manager
+import adafruit_requests
+import wifi
+
+class Connections:
+    '''Can be used in place of an adafruit_requests.Session. A failed request
+    is retried once after closing the sockets and reconnecting the WiFi if it
+    has dropped.'''
+    def __init__(self, ssid, password):
+        self.ssid = ssid
+        self.password = password
+        self.pool = None
+        self.session = None
+        self.reconnects = 0
+        self.connect()
+
+    def connect(self):
+        if not wifi.radio.connected:
+            print(f'CONNECTIONS: connecting to {self.ssid}')
+            wifi.radio.connect(self.ssid, self.password)
+            print(f'Connected to {self.ssid}')
+        if self.session is None:
+            # Shared with anything else on the radio, e.g. other libraries.
+            self.pool = adafruit_connection_manager.get_radio_socketpool(wifi.radio)
+            context = adafruit_connection_manager.get_radio_ssl_context(wifi.radio)
+            self.session = adafruit_requests.Session(self.pool, context)
+
+    def reconnect(self):
+        '''Closes every socket and makes sure the WiFi is up. The session,
+        and everything the modules have fetched, is kept.'''
+        self.reconnects += 1
+        print(f'CONNECTIONS: reconnect #{self.reconnects}')
+        adafruit_connection_manager.connection_manager_close_all(self.pool)
+        self.connect()
+
+    def get(self, url, headers=None):
+        if headers is None:
+            headers = {}
+        try:
+            return self.session.get(url, headers=headers)
+        except (OSError, RuntimeError) as e:
+            print(f'CONNECTIONS: {e} fetching {url}')
+            self.reconnect()
+            return self.session.get(url, headers=headers)
@@ -0,0 +1,196 @@
+# Guy
+# diagnostics.py
+# Copyright 2025, Jonathan Koren
+# Licensed under the Gnu Public License v3
+#
+# Times how long each module spends on the network, parsing, building shapes,
+# and in draw(), tap() and refresh(), along with how much heap it used. Every
+# span is logged on its own line, e.g.
+#
+#   DIAG: span=weather.network ms=412 alloc=1824 free=80112
+#
+# except for ones that happen every frame, like display.refresh, which
+# compositor.py sums up instead. The last SAMPLES of each are kept for the
+# Diagnostics module, which shows their percentiles.
+#
+# CircuitPython doesn't count allocations, so `alloc` is how much gc.mem_free()
+# dropped during the span. If the garbage collector ran in the middle, it's an
+# undercount. On CPython it's left out.
+
+import displayio
+
+from adafruit_ticks import ticks_ms, ticks_diff
+
+from fonts import make_label
+from memory import mem_free
+
+SAMPLES = 32 # per span
+TTL = 5 # seconds between redraws of the diagnostics module
+FRAME_TTL = 1 # draws sooner than this are animation frames, and aren't logged
+
+class Rolling:
+    '''The last `size` values of something.'''
+    def __init__(self, size=SAMPLES):
+        self.size = size
+        self.values = []
+        self.next = 0
+
+    def add(self, value):
+        if len(self.values) < self.size:
+            self.values.append(value)
+        else:
+            self.values[self.next] = value
+        self.next = (self.next + 1) % self.size
+
+    def percentile(self, p):
+        if len(self.values) == 0:
+            return None
+        ordered = sorted(self.values)
+        return ordered[min(len(ordered) - 1, p * len(ordered) // 100)]
+
+class Span:
+    '''Times the code in a `with` block. Inside a coroutine this includes time
+    spent in other tasks while it's waiting.'''
+    def __init__(self, recorder, name, log=True):
+        self.recorder = recorder
+        self.name = name
+        self.log = log
+
+    def __enter__(self):
+        self.free = mem_free()
+        self.start = ticks_ms()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        ms = ticks_diff(ticks_ms(), self.start)
+        free = mem_free()
+        alloc = None
+        if free is not None:
+            alloc = max(0, self.free - free)
+        self.recorder.record(self.name, ms, alloc, free, self.log)
+        return False
+
+class Recorder:
+    def __init__(self):
+        self.names = [] # in the order they were first seen
+        self.times = {} # name -> Rolling milliseconds
+        self.allocs = {} # name -> Rolling bytes
+        self.lowest_free = None
+
+    def span(self, module, phase, log=True):
+        '''log=False keeps the span quiet on the console, for ones that
+        happen every frame.'''
+        return Span(self, f'{module}.{phase}', log)
+
+    def record(self, name, ms, alloc, free, log=True):
+        if name not in self.times:
+            self.names.append(name)
+            self.times[name] = Rolling()
+            self.allocs[name] = Rolling()
+        self.times[name].add(ms)
+        if alloc is None:
+            if log:
+                print(f'DIAG: span={name} ms={ms}')
+        else:
+            self.allocs[name].add(alloc)
+            if self.lowest_free is None or free < self.lowest_free:
+                self.lowest_free = free
+            if log:
+                print(f'DIAG: span={name} ms={ms} alloc={alloc} free={free}')
+
+recorder = Recorder()
+
+def span(module, phase):
+    '''Times a phase of a module, e.g.
+
+    with span('weather', 'network'):
+        response = await self.fetcher.get()
+    '''
+    return recorder.span(module, phase)
+
+class Timed:
+    '''Wraps a module so that every draw(), tap() and refresh() is timed.'''
+    def __init__(self, module, name=None):
+        self.module = module
+        self.name = name
+        if self.name is None:
+            self.name = type(module).__name__.lower()
+        if hasattr(module, 'refresh'):
+            # only modules that refresh get a refresh(), see MainLoop.reset()
+            self.refresh = self.timed_refresh
+
+    def draw(self, timestamp):
+        with span(self.name, 'draw') as timing:
+            (ttl, group) = self.module.draw(timestamp)
+            # frames of an animation come too often to log each one
+            timing.log = ttl >= FRAME_TTL
+            return (ttl, group)
+
+    def tap(self, x, y):
+        with span(self.name, 'tap'):
+            return self.module.tap(x, y)
+
+    async def timed_refresh(self, timestamp):
+        with span(self.name, 'refresh'):
+            return await self.module.refresh(timestamp)
+
+    def release(self):
+        if hasattr(self.module, 'release'):
+            return self.module.release()
+        return []
+
+###############################################################################
+
+def format_value(value):
+    if value is None:
+        return '-'
+    if value >= 10000:
+        return f'{value // 1000}k'
+    return str(value)
+
+class Diagnostics:
+    '''A module that shows the 50th and 90th percentile and the worst of the
+    recent timings. Tapping switches between time and memory.'''
+    def __init__(self, rec=recorder):
+        self.recorder = rec
+        self.show_memory = False
+        self.group = None
+        self.label = None
+
+    def describe(self):
+        if self.show_memory:
+            lines = [f'bytes p50 p90 max  low {format_value(self.recorder.lowest_free)}']
+            rolls = self.recorder.allocs
+        else:
+            lines = ['ms  p50 p90 max']
+            rolls = self.recorder.times
+        for name in self.recorder.names:
+            roll = rolls[name]
+            if len(roll.values) == 0:
+                continue
+            lines.append(f'{name} {format_value(roll.percentile(50))} '
+                         f'{format_value(roll.percentile(90))} {format_value(roll.percentile(100))}')
+        return '\n'.join(lines)
+
+    def draw(self, timestamp):
+        '''Returns a TTL in seconds and a displayio.Group with the latest
+        percentiles. The label is made once and its text replaced.'''
+        text = self.describe()
+        if self.group is None:
+            self.group = displayio.Group()
+            self.label = make_label(text, 0x00FF00, 60, 80)
+            self.group.append(self.label)
+        else:
+            self.label.text = text
+        return (TTL, self.group)
+
+    def release(self):
+        if self.group is None:
+            return []
+        self.group = None
+        self.label = None
+        return ['text']
+
+    def tap(self, x, y):
+        self.show_memory = not self.show_memory
+        return self.draw(0)
@@ -1,6 +1,5 @@
-import displayio
-
 from chernoff import *
+from animation import Animator, Pose
 
 EMOTIONS = [ Emotion.ANGRY, 
              Emotion.HAPPY_3, Emotion.HAPPY_2, Emotion.HAPPY_1, 
@@ -10,19 +9,28 @@ EMOTIONS = [ Emotion.ANGRY,
 
 COLORS = [ 0xffffff, 0xffff00, 0xff00ff, 0x00ffff, 0xff0000, 0x00ff00, 0x0000ff ]
 
-TTL = 1 # seconds
+TTL = 1 # seconds each face is held once it's tweened in
 
 class FaceAnimation:
-    '''Displays a series of faces.'''
+    '''Displays a series of faces, tweening from each one to the next.'''
     def __init__(self, face_size):
         self.emotion_index = 0
         self.color_index = 0
         self.face = Face(face_size)
+        self.animator = Animator(self.face)
+        self.group = None
 
     def draw(self, timestamp):
         '''Takes a timestamp, and returns a TTL in seconds for next drawing
         update and a displayio.Group .'''
+        if self.animator.running():
+            return (self.next_frame(), self.group)
+
         print(f'FACEANIMATION draw {self.emotion_index} {self.color_index}')
+        pose = None
+        if self.group is not None:
+            pose = Pose(self.face)
+
         self.face.emotion = EMOTIONS[self.emotion_index]
         self.face.color = COLORS[self.color_index]
         self.face.reset_color()
@@ -31,17 +39,42 @@ class FaceAnimation:
             self.face.reset_pupils()
             self.face.reset_eyebrows()
 
+        self.emotion_index = (self.emotion_index + 1) % len(EMOTIONS)
+
         # draw
-        main = displayio.Group()
-        self.face.draw(main)
+        if pose is None:
+            self.group = self.face.render()
+            return (TTL, self.group)
+        self.animator.start(pose)
+        return (self.next_frame(), self.group)
 
-        self.emotion_index = (self.emotion_index + 1) % len(EMOTIONS)
-        return (TTL, main)
+    def next_frame(self):
+        ttl = self.animator.step()
+        if ttl is None:
+            return TTL
+        return ttl
+
+    def release(self):
+        '''Drops the face's shapes. The next draw() makes them again.'''
+        if self.group is None:
+            return []
+        self.animator.cancel()
+        self.face.release()
+        self.group = None
+        return ['face']
 
     def tap(self, x, y):
         '''Takes an x,y coordinate of a tap on the touch screen and returns a
         TTL in seconds for next drawing update and a displayio.Group .'''
         print('FACEANIMATION tap')
         self.color_index = (self.color_index + 1) % len(COLORS)
-        return self.draw(0)
+        if self.group is None:
+            return self.draw(0)
+
+        # recolor the face that's already up
+        self.face.color = COLORS[self.color_index]
+        self.face.reset_color()
+        if self.animator.running():
+            return (self.next_frame(), self.group)
+        return (TTL, self.group)
 
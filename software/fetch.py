@@ -0,0 +1,126 @@
+# Guy
+# fetch.py
+# Copyright 2025, Jonathan Koren
+# Licensed under the Gnu Public License v3
+#
+# Fetches a URL over and over without downloading it again when it hasn't
+# changed. The server's ETag and Last-Modified are sent back with every
+# request, and a 304 Not Modified means there is nothing new. gzip is asked for
+# whenever there's a way to decompress it.
+#
+# adafruit_requests has no way to wait for the network without blocking, so
+# connecting, the TLS handshake, sending the request, and waiting for the
+# server to answer hold up every other task. Other tasks get to run just
+# before and after, and between every chunk of the body as it's read.
+
+import asyncio
+import json
+
+try:
+    import zlib
+except ImportError:
+    zlib = None
+
+GZIP_WBITS = 31 # tells zlib to expect a gzip header
+GZIP_MAGIC = b'\x1f\x8b'
+CHUNK_SIZE = 512 # bytes of a body read between letting other tasks run
+
+# CPython can decompress a stream a chunk at a time. CircuitPython can only
+# decompress a whole body at once.
+STREAMING_GZIP = zlib is not None and hasattr(zlib, 'decompressobj')
+BUFFERED_GZIP = zlib is not None and hasattr(zlib, 'decompress')
+
+# Where servers say how long to wait after a 429. OpenSky uses its own.
+RETRY_AFTER_HEADERS = ('retry-after', 'x-rate-limit-retry-after-seconds')
+
+class RateLimited(ValueError):
+    '''HTTP 429 Too Many Requests. retry_after is how many seconds the server
+    asked to be left alone for, or None if it didn't say.'''
+    def __init__(self, url, retry_after):
+        super().__init__(f'HTTP 429 from {url}')
+        self.retry_after = retry_after
+
+class Fetcher:
+    def __init__(self, session, url, streaming=False):
+        '''streaming is True if the body will be read with iter_content(). gzip
+        is only asked for if it can be decompressed that way.'''
+        self.session = session
+        self.url = url
+        self.etag = None
+        self.last_modified = None
+        self.gzip = STREAMING_GZIP if streaming else BUFFERED_GZIP
+        self.not_modified = 0 # 304s so far
+        self.bytes_received = 0 # body bytes received, before decompressing
+
+    def headers(self):
+        headers = {}
+        if self.etag is not None:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified is not None:
+            headers['If-Modified-Since'] = self.last_modified
+        if self.gzip:
+            headers['Accept-Encoding'] = 'gzip'
+        return headers
+
+    async def get(self):
+        '''Returns the response, or None if nothing has changed since the last
+        time. The response needs to be closed, e.g. with `with`.'''
+        await asyncio.sleep(0)
+        response = self.session.get(self.url, headers=self.headers())
+        await asyncio.sleep(0)
+        if response.status_code == 304:
+            response.close()
+            self.not_modified += 1
+            return None
+        if response.status_code == 429:
+            retry_after = None
+            for name in RETRY_AFTER_HEADERS:
+                value = response.headers.get(name)
+                if value is not None and value.isdigit():
+                    retry_after = int(value)
+                    break
+            response.close()
+            raise RateLimited(self.url, retry_after)
+        if response.status_code != 200:
+            response.close()
+            raise ValueError(f'HTTP {response.status_code} from {self.url}')
+
+        self.etag = response.headers.get('etag')
+        self.last_modified = response.headers.get('last-modified')
+        return response
+
+    def forget(self):
+        '''Makes the next get() download everything again.'''
+        self.etag = None
+        self.last_modified = None
+
+    async def json(self, response, chunk_size=CHUNK_SIZE):
+        '''Like response.json(), but decompresses gzip if need be, and lets
+        other tasks run between chunks of the body.'''
+        chunks = []
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            self.bytes_received += len(chunk)
+            chunks.append(chunk)
+            await asyncio.sleep(0)
+        body = b''.join(chunks)
+        chunks = None
+        # CPython's requests has already decompressed the body, so look for the
+        # gzip header rather than trusting Content-Encoding.
+        if body[:2] == GZIP_MAGIC:
+            body = zlib.decompress(body, GZIP_WBITS)
+        return json.loads(body.decode('utf-8'))
+
+    def iter_content(self, response, chunk_size):
+        '''Like response.iter_content(), but decompresses gzip if need be.'''
+        decompressor = None
+        first = True
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            self.bytes_received += len(chunk)
+            if first and chunk[:2] == GZIP_MAGIC:
+                decompressor = zlib.decompressobj(GZIP_WBITS)
+            first = False
+            if decompressor is not None:
+                chunk = decompressor.decompress(chunk)
+            yield chunk
+        if decompressor is not None:
+            yield decompressor.flush()
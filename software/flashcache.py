@@ -0,0 +1,111 @@
+# Guy
+# flashcache.py
+# Copyright 2025, Jonathan Koren
+# Licensed under the Gnu Public License v3
+#
+# Keeps the last good data of a module in a small file on the CIRCUITPY
+# drive: the time it was fetched on the first line, and the data as compact
+# JSON on the second, so after a reboot, or while the WiFi is down, there's
+# something to show until the next fetch works.
+#
+# Flash wears out, so a cache is written at most once every MIN_WRITE_SECONDS,
+# and not at all if the data hasn't changed. The file is written to a .tmp
+# file next to the old one, the old one is removed, and the .tmp file renamed.
+# A reset while writing leaves the old file, and one after removing it leaves
+# the whole .tmp file, which load() falls back to.
+#
+# CircuitPython only lets code write to the drive when boot.py has remounted
+# it, and then the computer can only read it. See boot.py.example. Until then,
+# or if the drive is full, save() prints why once and does nothing.
+
+import json
+import os
+import time
+
+from fonts import make_label
+
+CACHE_DIR = '/cache'
+MIN_WRITE_SECONDS = 30 * 60
+STALE_TEXT = 'Saved data'
+STALE_COLOR = 0xff8000
+
+def make_stale_label(screen_size):
+    '''A label saying that what's shown was loaded from the cache and hasn't
+    been fetched since.'''
+    return make_label(STALE_TEXT, STALE_COLOR, screen_size // 2 - 60, 60)
+
+class FlashCache:
+    def __init__(self, name, min_write_seconds=MIN_WRITE_SECONDS, directory=None):
+        if directory is None:
+            directory = CACHE_DIR
+        self.directory = directory
+        self.path = f'{directory}/{name}.json'
+        self.min_write_seconds = min_write_seconds
+        self.last_write = None # time.monotonic() of the last write
+        self.saved_hash = None # of what's in the file
+        self.writable = True
+        self.writes = 0
+
+    def load(self):
+        '''Returns the (timestamp, data) that were saved, or None if there
+        isn't a file or it can't be read.'''
+        try:
+            try:
+                f = open(self.path)
+                path = self.path
+            except OSError as e:
+                # a reset between removing the old file and renaming
+                path = self.path + '.tmp'
+                try:
+                    f = open(path)
+                except OSError:
+                    raise e
+            with f:
+                timestamp = float(f.readline())
+                text = f.readline()
+            data = json.loads(text)
+            self.saved_hash = hash(text)
+            print(f'FLASHCACHE: loaded {len(text)} bytes from {path}')
+            return (timestamp, data)
+        except (OSError, ValueError) as e:
+            print(f'FLASHCACHE: nothing loaded from {self.path}: {e}')
+            return None
+
+    def save(self, timestamp, data):
+        '''Writes the data, with the timestamp it was fetched at, unless it
+        was written too recently or hasn't changed. Returns True if it was
+        written.'''
+        if not self.writable:
+            return False
+        now = time.monotonic()
+        if self.last_write is not None and now - self.last_write < self.min_write_seconds:
+            return False
+        text = json.dumps(data, separators=(',', ':'))
+        if hash(text) == self.saved_hash:
+            return False
+
+        temp = self.path + '.tmp'
+        try:
+            try:
+                os.mkdir(self.directory)
+            except OSError:
+                pass # already there, or the open() below will say why not
+            with open(temp, 'w') as f:
+                f.write(f'{timestamp}\n')
+                f.write(text)
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            os.rename(temp, self.path)
+        except OSError as e:
+            # e.g. errno 30, the drive is read only without boot.py
+            print(f'FLASHCACHE: not saving to {self.path}: {e}')
+            self.writable = False
+            return False
+
+        self.last_write = now
+        self.saved_hash = hash(text)
+        self.writes += 1
+        print(f'FLASHCACHE: wrote {len(text)} bytes to {self.path}')
+        return True
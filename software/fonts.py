@@ -0,0 +1,72 @@
+# Guy
+# fonts.py
+# Copyright 2025, Jonathan Koren
+# Licensed under the Gnu Public License v3
+#
+# One place to get fonts from. Loading a PCF font re-reads it from flash and
+# allocates every glyph bitmap again, so fonts are loaded once and shared by
+# every module.
+
+import displayio
+
+from adafruit_display_text import label
+from adafruit_bitmap_font import bitmap_font
+
+BASE_FONT_SIZE = 24
+DEFAULT_FONT = f'Junction-Regular-{BASE_FONT_SIZE}.pcf'
+
+# Glyphs that are loaded when the font is and never thrown away: digits, units,
+# and the letters used by callsigns and the weather text view.
+PRELOAD_GLYPHS = ('0123456789 .,:;-+%/^#()?!'
+                  'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+                  'abcdefghijklmnopqrstuvwxyz')
+
+# Glyphs outside of PRELOAD_GLYPHS (e.g. from error messages) are loaded on
+# demand. Once they take more than this many bytes they are all forgotten.
+MAX_EXTRA_GLYPH_BYTES = 4 * 1024
+
+_fonts = {}
+_pinned = set(ord(c) for c in PRELOAD_GLYPHS)
+
+def glyph_bytes(glyph):
+    '''Approximate size of a glyph's 1-bit bitmap. Rows are padded to 32 bits.'''
+    if glyph is None:
+        return 0
+    return glyph.height * ((glyph.width + 31) // 32) * 4
+
+def load_font(name=DEFAULT_FONT):
+    '''Returns the named font, loading it and its preloaded glyphs only the
+    first time it is asked for.'''
+    font = _fonts.get(name)
+    if font is None:
+        print(f'FONTS: loading {name}')
+        font = bitmap_font.load_font(name, displayio.Bitmap)
+        font.load_glyphs(PRELOAD_GLYPHS)
+        _fonts[name] = font
+    return font
+
+def trim(font):
+    '''Forgets every glyph that isn't preloaded once they use more than
+    MAX_EXTRA_GLYPH_BYTES. Labels that already use them keep working.'''
+    # _glyphs is the glyph cache that every adafruit_bitmap_font font shares
+    glyphs = font._glyphs
+    extra = [cp for cp in glyphs if cp not in _pinned]
+    if sum(glyph_bytes(glyphs[cp]) for cp in extra) > MAX_EXTRA_GLYPH_BYTES:
+        print(f'FONTS: dropping {len(extra)} glyphs')
+        for cp in extra:
+            del glyphs[cp]
+
+def make_label(text, color, x, y, scale=1, name=DEFAULT_FONT):
+    '''Creates a label using a shared font.'''
+    font = load_font(name)
+    text_area = label.Label(font, text=text, color=color, scale=scale)
+    text_area.x = x
+    text_area.y = y
+    trim(font)
+    return text_area
+
+def make_simple_text(text):
+    '''Creates a displayio.Group that shows a simple line of text.'''
+    group = displayio.Group()
+    group.append(make_label(text, 0xFF0000, 100, 100))
+    return group
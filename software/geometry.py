@@ -0,0 +1,124 @@
+# Guy
+# geometry.py
+# Copyright 2025, Jonathan Koren
+# Licensed under the Gnu Public License v3
+#
+# Integer geometry for the face. Sines and cosines come from tables with one
+# entry per degree, scaled by ONE, so rotating a point or making an arc is a
+# few integer multiplies instead of calls into the float math library. On
+# CircuitPython every float is allocated on the heap, and small ints aren't.
+#
+# The answers are the same pixels the float math gives. The tables are only
+# accurate to about 1/ONE, so when an answer lands that close to where rounding
+# changes, it's worked out with the float math instead. That's rare, and
+# tools/check_geometry.py checks that the two always agree.
+#
+# Pupils are only checked with ints. The few that are outside their eye are
+# moved back with floats, since an integer square root would need longs.
+
+from math import atan, cos, radians, sin, sqrt, pi
+
+# Big enough that a radius of a few hundred pixels times a table entry is
+# still a small int on CircuitPython, which has 31 bits before it has to
+# allocate a long.
+FRACTION_BITS = 20
+ONE = 1 << FRACTION_BITS
+HALF = ONE >> 1
+
+# sin and cos of 0 to 359 degrees, times ONE. Made once when this is imported.
+SIN_TABLE = [round(sin(degrees / 180 * pi) * ONE) for degrees in range(360)]
+COS_TABLE = [round(cos(degrees / 180 * pi) * ONE) for degrees in range(360)]
+
+def sin_fixed(degrees):
+    '''sin() of whole degrees, times ONE.'''
+    if degrees < 0:
+        return -SIN_TABLE[-degrees % 360]
+    return SIN_TABLE[degrees % 360]
+
+def cos_fixed(degrees):
+    '''cos() of whole degrees, times ONE.'''
+    return COS_TABLE[abs(degrees) % 360]
+
+def fraction(value):
+    return value - ((value >> FRACTION_BITS) << FRACTION_BITS)
+
+def near_half(value, slack):
+    return abs(fraction(value) - HALF) <= slack
+
+def near_whole(value, slack):
+    f = fraction(value)
+    return f <= slack or f >= ONE - slack
+
+def round_fixed(value):
+    '''Rounds a fixed point number to the nearest integer.'''
+    return (value + HALF) >> FRACTION_BITS
+
+def trunc_fixed(value):
+    '''Drops the fraction of a fixed point number, towards zero like int().'''
+    if value < 0:
+        return -((-value) >> FRACTION_BITS)
+    return value >> FRACTION_BITS
+
+###############################################################################
+
+def rotate(x, y, degrees):
+    '''Rotates an integer point around 0, 0 and rounds it. Only whole degrees
+    use the tables.'''
+    if not isinstance(degrees, int):
+        r = radians(degrees)
+        return (round((x * cos(r)) - (y * sin(r))), round((x * sin(r)) + (y * cos(r))))
+    c = cos_fixed(degrees)
+    s = sin_fixed(degrees)
+    rx = x * c - y * s
+    ry = x * s + y * c
+    slack = abs(x) + abs(y) + 1
+    if near_half(rx, slack) or near_half(ry, slack):
+        r = radians(degrees)
+        return (round((x * cos(r)) - (y * sin(r))), round((x * sin(r)) + (y * cos(r))))
+    return (round_fixed(rx), round_fixed(ry))
+
+def arc_point(radius, degrees):
+    '''Where adafruit_display_shapes.arc.Arc puts a point of an arc, relative
+    to its center.'''
+    x = radius * cos_fixed(degrees)
+    y = radius * sin_fixed(degrees)
+    slack = abs(radius) + 1
+    if near_whole(x, slack) or near_whole(y, slack):
+        alpha = degrees / 180 * pi
+        return (int(radius * cos(alpha)), -int(radius * sin(alpha)))
+    return (trunc_fixed(x), -trunc_fixed(y))
+
+def arc_points(radius, angle, direction, segments, arc_width):
+    '''The outline adafruit_display_shapes.arc.Arc makes. Every point has to
+    be at whole degrees, so angle / 2 and angle / segments must be whole.'''
+    start = direction - angle // 2
+    step = angle // segments
+    points = []
+    for i in range(segments + 1):
+        points.append(arc_point(radius, start + i * step))
+    if arc_width > 1:
+        for i in range(segments, -1, -1):
+            points.append(arc_point(radius - arc_width, start + i * step))
+    return points
+
+def pull_in(dx, dy, outer_radius, inner_radius):
+    '''How far a circle of inner_radius centered at dx, dy has to move back
+    towards 0, 0 to be inside a circle of outer_radius centered there.
+    Returns (0, 0) if it's already inside.'''
+    limit = outer_radius - inner_radius
+    if limit >= 0 and dx * dx + dy * dy <= limit * limit:
+        return (0, 0)
+    return pull_in_float(dx, dy, outer_radius, inner_radius)
+
+def pull_in_float(dx, dy, outer_radius, inner_radius):
+    '''pull_in() with the float math bound_pupil_to_eye() used to use.'''
+    overage = sqrt(dx * dx + dy * dy) + inner_radius - outer_radius
+    angle = pi / 2
+    move_x = 0
+    if dx > 0:
+        angle = atan(dy / dx)
+        move_x = round(cos(angle) * overage)
+    elif dx != 0:
+        angle = atan(dy / -dx)
+        move_x = -round(cos(angle) * overage)
+    return (move_x, round(sin(angle) * overage))
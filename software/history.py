@@ -0,0 +1,90 @@
+# Guy
+# history.py
+# Copyright 2025, Jonathan Koren
+# Licensed under the Gnu Public License v3
+#
+# A fixed number of recent samples, kept in arrays rather than lists of
+# objects, so that it takes the same few kilobytes of heap no matter how long
+# Guy has been running. Missing values are stored as NaN.
+
+from array import array
+
+NAN = float('nan')
+
+def is_nan(value):
+    return value != value
+
+class History:
+    '''A ring buffer of `size` samples. Every sample has a timestamp and one
+    float for each of `columns`.'''
+    def __init__(self, columns, size):
+        self.columns = columns
+        self.size = size
+        self.times = array('l', [0] * size) # seconds since the epoch
+        self.values = [array('f', [NAN] * size) for _ in columns]
+        self.next = 0 # where the next sample goes
+        self.count = 0
+
+    def add(self, timestamp, values):
+        '''Adds a sample, overwriting the oldest once the buffer is full.
+        None is stored as NaN.'''
+        self.times[self.next] = int(timestamp)
+        for (column, value) in zip(self.values, values):
+            if value is None:
+                value = NAN
+            column[self.next] = value
+        self.next = (self.next + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+
+    def index(self, i):
+        '''Where the i'th oldest sample is in the arrays.'''
+        return (self.next - self.count + i) % self.size
+
+    def column(self, name):
+        return self.values[self.columns.index(name)]
+
+    def latest_time(self):
+        if self.count == 0:
+            return None
+        return self.times[self.index(self.count - 1)]
+
+    def change(self, name, seconds):
+        '''How much a column has changed over the last `seconds`: the newest
+        value minus the oldest one that's that recent. None if there aren't
+        two values to compare.'''
+        if self.count < 2:
+            return None
+        values = self.column(name)
+        newest = self.index(self.count - 1)
+        if is_nan(values[newest]):
+            return None
+        since = self.times[newest] - seconds
+        oldest = None
+        for i in range(self.count - 1):
+            idx = self.index(i)
+            if self.times[idx] >= since and not is_nan(values[idx]):
+                oldest = idx
+                break
+        if oldest is None:
+            return None
+        return values[newest] - values[oldest]
+
+    def value_range(self, name, since):
+        '''The smallest and largest values of a column since `since`, or None
+        if there aren't any.'''
+        values = self.column(name)
+        low = None
+        high = None
+        for i in range(self.count):
+            idx = self.index(i)
+            value = values[idx]
+            if self.times[idx] < since or is_nan(value):
+                continue
+            if low is None or value < low:
+                low = value
+            if high is None or value > high:
+                high = value
+        if low is None:
+            return None
+        return (low, high)
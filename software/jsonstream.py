@@ -0,0 +1,207 @@
+# Guy
+# jsonstream.py
+# Copyright 2025, Jonathan Koren
+# Licensed under the Gnu Public License v3
+#
+# A small streaming JSON reader. Instead of reading a whole document into
+# memory and parsing it, it reads it a chunk at a time and hands back one value
+# at a time, so peak memory is about one chunk no matter how big the document
+# is.
+
+import json
+
+class Token:
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+# Punctuation tokens. Compare with `is`.
+BEGIN_ARRAY = Token('[')
+END_ARRAY = Token(']')
+BEGIN_OBJECT = Token('{')
+END_OBJECT = Token('}')
+COLON = Token(':')
+COMMA = Token(',')
+END = Token('END')
+
+PUNCTUATION = {
+    ord('['): BEGIN_ARRAY,
+    ord(']'): END_ARRAY,
+    ord('{'): BEGIN_OBJECT,
+    ord('}'): END_OBJECT,
+    ord(':'): COLON,
+    ord(','): COMMA,
+}
+
+# Bytes of a bytes object are ints, and MicroPython may not find an int in
+# bytes, so these are sets of ints.
+WHITESPACE = {ord(' '), ord('\t'), ord('\r'), ord('\n')}
+DELIMITERS = WHITESPACE | {ord(','), ord(':'), ord(']'), ord('}')}
+QUOTE = ord('"')
+BACKSLASH = ord('\\')
+
+class Tokenizer:
+    '''Turns an iterable of byte chunks (e.g. Response.iter_content()) into
+    JSON tokens. Strings, numbers, true, false, and null are returned as
+    Python values, and everything else as one of the tokens above.'''
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buf = b''
+        self.pos = 0
+
+    def fill(self):
+        '''Reads another chunk, keeping whatever hasn't been used yet. Returns
+        False at the end of the document.'''
+        try:
+            chunk = next(self.chunks)
+        except StopIteration:
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def next(self):
+        while True:
+            if self.pos >= len(self.buf):
+                if not self.fill():
+                    return END
+                continue
+            c = self.buf[self.pos]
+            if c in WHITESPACE:
+                self.pos += 1
+                continue
+            break
+
+        token = PUNCTUATION.get(c)
+        if token is not None:
+            self.pos += 1
+            return token
+        if c == QUOTE:
+            return self.read_string()
+        return self.read_literal()
+
+    def read_string(self):
+        start = self.pos + 1
+        end = start
+        while True:
+            end = self.buf.find(b'"', end)
+            if end < 0:
+                end = len(self.buf) - self.pos
+                if not self.fill():
+                    raise ValueError('unterminated string')
+                start = 1
+                continue
+            # an escaped quote has an odd number of backslashes before it
+            slashes = 0
+            while self.buf[end - 1 - slashes] == BACKSLASH:
+                slashes += 1
+            if slashes % 2 == 0:
+                break
+            end += 1
+
+        raw = self.buf[start:end].decode('utf-8')
+        self.pos = end + 1
+        if '\\' in raw:
+            return json.loads('"' + raw + '"')
+        return raw
+
+    def read_literal(self):
+        end = self.pos
+        while True:
+            if end >= len(self.buf):
+                offset = end - self.pos
+                if not self.fill():
+                    break
+                end = offset
+                continue
+            if self.buf[end] in DELIMITERS:
+                break
+            end += 1
+
+        raw = self.buf[self.pos:end]
+        self.pos = end
+        if raw == b'null':
+            return None
+        if raw == b'true':
+            return True
+        if raw == b'false':
+            return False
+        raw = raw.decode('utf-8')
+        if '.' in raw or 'e' in raw or 'E' in raw:
+            return float(raw)
+        return int(raw)
+
+    def expect(self, token):
+        t = self.next()
+        if t is not token:
+            raise ValueError(f'expected {token} got {t}')
+
+    def skip_value(self, token):
+        '''Skips over the value that starts with `token`, including anything
+        nested inside of it.'''
+        depth = 0
+        while True:
+            if token is BEGIN_ARRAY or token is BEGIN_OBJECT:
+                depth += 1
+            elif token is END_ARRAY or token is END_OBJECT:
+                depth -= 1
+            elif token is END:
+                raise ValueError('unexpected end of document')
+            if depth == 0:
+                return
+            token = self.next()
+
+def iter_rows(chunks, key, width):
+    '''Yields the rows of an array of arrays stored under `key` in a top level
+    JSON object, e.g. the "states" of OpenSky's /states/all. Each row is a
+    list of `width` columns. Extra columns are ignored and nested values
+    (arrays or objects inside a row) are skipped and left as None. The same
+    list is reused for every row, so copy anything that needs to be kept.'''
+    tokens = Tokenizer(chunks)
+    row = [None] * width
+    tokens.expect(BEGIN_OBJECT)
+    while True:
+        t = tokens.next()
+        if t is END_OBJECT:
+            return
+        if t is COMMA:
+            continue
+        if not isinstance(t, str):
+            raise ValueError(f'expected key got {t}')
+        name = t
+        tokens.expect(COLON)
+        t = tokens.next()
+        if name != key or t is None:
+            tokens.skip_value(t)
+            continue
+        if t is not BEGIN_ARRAY:
+            raise ValueError(f'{key} is not an array')
+
+        while True:
+            t = tokens.next()
+            if t is END_ARRAY:
+                break
+            if t is COMMA:
+                continue
+            if t is not BEGIN_ARRAY:
+                raise ValueError(f'expected row got {t}')
+
+            for i in range(width):
+                row[i] = None
+            column = 0
+            while True:
+                t = tokens.next()
+                if t is END_ARRAY:
+                    break
+                if t is COMMA:
+                    column += 1
+                    continue
+                if t is BEGIN_ARRAY or t is BEGIN_OBJECT:
+                    tokens.skip_value(t)
+                elif t is END:
+                    raise ValueError('unexpected end of document')
+                elif column < width:
+                    row[column] = t
+            yield row
@@ -0,0 +1,205 @@
+# Guy
+# mainloop.py
+# Copyright 2025, Jonathan Koren
+# Licensed under the Gnu Public License v3
+#
+# Runs the modules. One task handles touches, draws the current module, and
+# starts a background task whenever a module's data needs refreshing, so the
+# screen keeps responding while data is downloaded. Between those it sleeps
+# until the next deadline. What's drawn reaches the screen through the
+# compositor, at most one refresh a frame.
+
+import asyncio
+import time
+
+from adafruit_ticks import ticks_ms, ticks_diff
+
+from compositor import Compositor
+from memory import MemoryManager
+from scheduler import Scheduler
+
+TOUCH_DEBOUNCE = 0.25 # seconds between touches
+PREFETCH_DISTANCE = 1 # modules on either side of the current one that are kept fresh
+
+def touch_area(x, size):
+    left = size // 4
+    right = left * 3
+    # These are reversed because the touch screen is upsdide down
+    if x < left:
+        return 1
+    elif x > right:
+        return -1
+    else:
+        return 0
+
+def touch_to_display(x, y, size):
+    '''The touch screen is upside down compared to the display, so this turns
+    a touch into the display coordinates that modules draw with.'''
+    return (size - 1 - x, size - 1 - y)
+
+class MainLoop:
+    def __init__(self, display, touch, modules, heap_budget=None):
+        '''display needs a width and a root_group. touch needs touched and
+        touches, like adafruit_qualia's touch screen. heap_budget is the most
+        heap in bytes the modules' groups are allowed to push it to, see
+        memory.py.'''
+        self.display = display
+        self.compositor = Compositor(display)
+        self.touch = touch
+        self.modules = modules
+        self.memory = MemoryManager(modules, heap_budget)
+        self.current_module_idx = 0
+        self.group_caches = [None] * len(modules)
+        self.refreshed = [False] * len(modules) # new data since the last draw()
+        self.refreshing = [False] * len(modules) # refresh() is running
+        self.tasks = [None] * len(modules) # the task running refresh()
+        self.runs = [0] * len(modules) # refreshes started, to tell them apart
+        self.expired = [False] * len(modules) # due for a refresh, but too far away
+        self.scheduler = Scheduler()
+        self.reset()
+
+    def reset(self):
+        '''Gets ready for run() to be called again after it raised an error.
+        Modules are drawn and refreshed again right away, but keep their
+        data.'''
+        self.error = None # raised by a refresh task, to be raised by run()
+        self.scheduler.set('draw', 0)
+        for idx in range(len(self.modules)):
+            if self.tasks[idx] is not None:
+                # CircuitPython's asyncio.run() leaves other tasks running
+                # when the main one raises, so this one would still be
+                # using the module's Fetcher.
+                self.tasks[idx].cancel()
+                self.tasks[idx] = None
+            self.runs[idx] += 1
+            self.refreshing[idx] = False
+            self.expired[idx] = False
+            if hasattr(self.modules[idx], 'refresh'):
+                self.scheduler.set(('refresh', idx), 0)
+
+    def show(self, ttl, group):
+        if group is not None:
+            # None means what's shown hasn't changed, so it isn't refreshed
+            self.compositor.show(group)
+        self.scheduler.set('draw', ttl)
+
+    def draw_current(self):
+        idx = self.current_module_idx
+        self.refreshed[idx] = False
+        (ttl, group) = self.modules[idx].draw(time.time())
+        if group is not None:
+            self.group_caches[idx] = group
+        self.memory.shown(idx)
+        self.show(ttl, group)
+
+    def release_memory(self):
+        '''Lets go of the groups of modules the memory manager released.'''
+        for idx in self.memory.check(self.current_module_idx):
+            self.group_caches[idx] = None
+
+    def handle_touch(self):
+        touches = self.touch.touches
+        if len(touches) == 0:
+            return
+        x = touches[0]['x']
+        y = touches[0]['y']
+        side = touch_area(x, self.display.width)
+        print('TOUCH!', side)
+        if side < 0:
+            self.current_module_idx -= 1
+            if self.current_module_idx < 0:
+                self.current_module_idx = len(self.modules) - 1
+        elif side > 0:
+            self.current_module_idx = (self.current_module_idx + 1) % len(self.modules)
+
+        if side != 0:
+            # Show what we have right away, even if it's stale, and draw it
+            # on the next pass. New neighbors that have expired are refreshed
+            # in the background.
+            cached = self.group_caches[self.current_module_idx]
+            if cached is None:
+                self.draw_current()
+            else:
+                self.compositor.show(cached)
+                self.scheduler.set('draw', 0)
+            self.revalidate()
+        else:
+            (x, y) = touch_to_display(x, y, self.display.width)
+            self.show(*self.modules[self.current_module_idx].tap(x, y))
+
+    def is_warm(self, idx):
+        '''True if the module is close enough to the current one to be kept
+        fresh.'''
+        distance = abs(idx - self.current_module_idx)
+        distance = min(distance, len(self.modules) - distance)
+        return distance <= PREFETCH_DISTANCE
+
+    def revalidate(self):
+        '''Refreshes the modules that expired while they were far away and are
+        now close.'''
+        for idx in range(len(self.modules)):
+            if self.expired[idx] and self.is_warm(idx):
+                self.expired[idx] = False
+                self.scheduler.set(('refresh', idx), 0)
+
+    def start_refreshes(self):
+        '''Starts a background refresh of every close module that's due.'''
+        for idx in range(len(self.modules)):
+            key = ('refresh', idx)
+            if self.refreshing[idx] or not self.scheduler.due(key):
+                continue
+            self.scheduler.clear(key)
+            if self.is_warm(idx):
+                self.refreshing[idx] = True
+                self.runs[idx] += 1
+                self.tasks[idx] = asyncio.create_task(self.refresh(idx, self.runs[idx]))
+            else:
+                self.expired[idx] = True
+
+    async def refresh(self, idx, run):
+        '''Refreshes one module's data and schedules its next refresh.'''
+        start = ticks_ms()
+        try:
+            ttl = await self.modules[idx].refresh(time.time())
+        except Exception as e:
+            self.error = e
+            return
+        finally:
+            if run == self.runs[idx]:
+                # not cancelled by reset(), which may have started another
+                self.refreshing[idx] = False
+                self.tasks[idx] = None
+            self.scheduler.busy(ticks_diff(ticks_ms(), start))
+        self.refreshed[idx] = True
+        self.scheduler.set(('refresh', idx), ttl)
+        if idx == self.current_module_idx:
+            # it may have changed what's on the screen
+            self.compositor.invalidate()
+
+        # build the group now, so a swipe only has to show it
+        if idx != self.current_module_idx:
+            group = self.modules[idx].draw(time.time())[1]
+            if group is not None:
+                self.group_caches[idx] = group
+
+    async def run(self):
+        '''Handles touches, redraws the current module, and starts refreshes
+        as they come due.'''
+        while True:
+            if self.error is not None:
+                raise self.error
+
+            if self.scheduler.ready('touch') and self.touch.touched:
+                self.handle_touch()
+                self.scheduler.set('touch', TOUCH_DEBOUNCE)
+            elif self.refreshed[self.current_module_idx] or self.scheduler.due('draw'):
+                self.draw_current()
+
+            self.start_refreshes()
+            self.release_memory()
+            wait = self.compositor.refresh()
+            if wait is None:
+                self.scheduler.clear('frame')
+            else:
+                self.scheduler.set('frame', wait)
+            await self.scheduler.sleep(self.touch)
@@ -0,0 +1,106 @@
+# Guy
+# memory.py
+# Copyright 2025, Jonathan Koren
+# Licensed under the Gnu Public License v3
+#
+# Keeps the heap under a budget by throwing away the display groups of the
+# modules that were shown least recently. A module that has a release() drops
+# the groups it can build again from its data, and returns their names.
+# Its next draw() builds them again. The budget is GUY_HEAP_BUDGET in
+# settings.toml, in bytes of heap in use. Without one, HEAP_RESERVE bytes are
+# kept free. When nothing can be released, the heap isn't collected again for
+# RETRY_MS, or until another module is shown.
+#
+# Every new high-water mark of the heap is printed:
+#
+#   MEMORY: high water 151 KB used, 41 KB free
+#   MEMORY: released opensky radar, 128 KB used
+
+import gc
+
+from adafruit_ticks import ticks_diff, ticks_ms
+
+HEAP_RESERVE = 64 * 1024 # bytes kept free when there's no budget
+HIGH_WATER_STEP = 4 * 1024 # only print high-water marks this much higher
+RETRY_MS = 1000 # after a check that couldn't release anything, wait this long
+
+def mem_free():
+    '''Free heap in bytes, or None when not running on CircuitPython.'''
+    if hasattr(gc, 'mem_free'):
+        return gc.mem_free()
+    return None
+
+def mem_alloc():
+    '''Heap in use in bytes, or None when not running on CircuitPython.'''
+    if hasattr(gc, 'mem_alloc'):
+        return gc.mem_alloc()
+    return None
+
+class MemoryManager:
+    def __init__(self, modules, budget=None):
+        '''modules are the main loop's modules. budget is the most heap that
+        should be in use, in bytes.'''
+        self.modules = modules
+        self.budget = budget
+        used = mem_alloc()
+        if self.budget is None and used is not None:
+            self.budget = used + mem_free() - HEAP_RESERVE
+        self.order = list(range(len(modules))) # least recently shown first
+        self.high_water = 0
+        self.printed_high_water = 0
+        self.releases = 0
+        self.stuck = None # ticks_ms() of the last check that released nothing
+
+    def shown(self, idx):
+        if idx != self.order[-1]:
+            self.stuck = None # the module that was showing can be released now
+        self.order.remove(idx)
+        self.order.append(idx)
+
+    def check(self, current_idx):
+        '''Releases the groups of the least recently shown modules until the
+        heap is under budget. Returns the indices of the modules that were
+        released, whose groups the caller shouldn't keep either.'''
+        used = mem_alloc()
+        if used is None:
+            return []
+        self.note(used)
+        if used <= self.budget:
+            self.stuck = None
+            return []
+        if self.stuck is not None and ticks_diff(ticks_ms(), self.stuck) < RETRY_MS:
+            # collecting every frame would blow the frame budget
+            return []
+
+        gc.collect()
+        released = []
+        for idx in self.order:
+            used = mem_alloc()
+            if used <= self.budget:
+                break
+            if idx == current_idx or not hasattr(self.modules[idx], 'release'):
+                continue
+            names = self.modules[idx].release()
+            if len(names) == 0:
+                continue
+            gc.collect()
+            released.append(idx)
+            self.releases += 1
+            print(f'MEMORY: released {self.name(idx)} {",".join(names)}, {mem_alloc() // 1024} KB used')
+        if len(released) == 0 and mem_alloc() > self.budget:
+            self.stuck = ticks_ms()
+        else:
+            self.stuck = None
+        return released
+
+    def note(self, used):
+        if used <= self.high_water:
+            return
+        self.high_water = used
+        if used - self.printed_high_water >= HIGH_WATER_STEP:
+            self.printed_high_water = used
+            print(f'MEMORY: high water {used // 1024} KB used, {mem_free() // 1024} KB free')
+
+    def name(self, idx):
+        module = self.modules[idx]
+        return getattr(module, 'name', type(module).__name__.lower())
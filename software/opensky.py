@@ -2,39 +2,107 @@
 # opensky.py
 # Copyright 2025, Jonathan Koren
 # Licensed under the Gnu Public License v3
+#
+# Between polls, each aircraft is moved along its track at its speed, a frame
+# every FRAME_SECONDS, so the dots glide instead of jumping. How often OpenSky
+# is polled depends on how much the traffic changes: when aircraft come and go
+# between polls it's polled more often, and when they don't, less. A 429 from
+# OpenSky backs off for as long as it asks, or twice as long each time it
+# doesn't say.
 
+import asyncio
 import displayio
 import hashlib
-import json
 
-from adafruit_display_text import label
-from adafruit_bitmap_font import bitmap_font
 from adafruit_display_shapes.circle import Circle
 
-from scale import linear_scale
-
-def make_simple_text(text):
-    '''Creates a displayio.Group that shows a simple line of text.'''
-    group = displayio.Group()
-    BASE_FONT_SIZE = 24
-    font = bitmap_font.load_font(f"Junction-Regular-{BASE_FONT_SIZE}.pcf", displayio.Bitmap)
-    font_scale = 1
-    color = 0xFF0000
-    text_area = label.Label(font, text=text, color=color, scale=font_scale)
-    text_area.x = 100
-    text_area.y = 100
-    group.append(text_area)
-    return group
-
-def parse_state(rec):
-    keys = ['icao24', 'callsign', 'origin_country', 'time_position',
-    'last_contact', 'longitude', 'latitude', 'baro_altitude',
-    'on_ground', 'true_track', 'vertical_rate', 'sensors', 'geo_altitude',
-    'squawk', 'spi', 'position_source', 'category']
-    d = {}
-    for i in range(len(rec)):
-        d[keys[i]] = rec[i]
-    return d
+from adafruit_ticks import ticks_diff, ticks_ms
+
+from diagnostics import span
+from fetch import Fetcher, RateLimited
+from flashcache import FlashCache, make_stale_label
+from fonts import BASE_FONT_SIZE, make_label, make_simple_text
+from jsonstream import iter_rows
+from projection import Projection
+from spatial import Grid
+
+# Columns of an OpenSky state vector
+# https://openskynetwork.github.io/opensky-api/rest.html#all-state-vectors
+ICAO24 = 0
+CALLSIGN = 1
+ORIGIN_COUNTRY = 2
+TIME_POSITION = 3
+LAST_CONTACT = 4
+LONGITUDE = 5
+LATITUDE = 6
+BARO_ALTITUDE = 7
+ON_GROUND = 8
+VELOCITY = 9
+TRUE_TRACK = 10
+# Nothing past TRUE_TRACK is drawn, so the rest of each state isn't kept.
+STATE_WIDTH = TRUE_TRACK + 1
+
+CHUNK_SIZE = 512 # bytes read from the socket at a time
+YIELD_EVERY = 16 # aircraft decoded between letting other tasks run
+ERROR_TTL = 60 # seconds before retrying a failed fetch
+TAP_RADIUS = 24 # pixels from a tap that an aircraft can be picked
+DETAILS_TTL = 10 # seconds an aircraft's details are shown
+
+FRAME_SECONDS = 0.25 # between frames of aircraft moving
+MIN_POLL = 15 # seconds between polls when the traffic changes a lot
+MAX_POLL = 120 # seconds between polls when it doesn't
+MAX_RECKONING = MAX_POLL + 30 # seconds aircraft are moved past their last position
+FIRST_POLL = 30
+BUSY_CHURN = 0.2 # fraction of aircraft that came or went between polls
+QUIET_CHURN = 0.05
+MAX_BACKOFF = 60 * 60 # most seconds to wait after being rate limited
+
+def rounded(value, digits):
+    if value is None:
+        return None
+    if digits == 0:
+        return round(value)
+    return round(value, digits)
+
+class Aircraft:
+    '''The parts of an OpenSky state that get drawn. Records are reused from
+    poll to poll, so fill() overwrites every field.'''
+    __slots__ = ('icao24', 'callsign', 'origin_country', 'longitude', 'latitude', 'altitude', 'velocity', 'track')
+
+    def __init__(self):
+        self.icao24 = None
+        self.callsign = None
+        self.origin_country = None
+        self.longitude = None
+        self.latitude = None
+        self.altitude = None
+        self.velocity = None
+        self.track = None
+
+    def fill(self, state):
+        '''Copies the columns we use out of a state row.'''
+        self.icao24 = state[ICAO24]
+        self.callsign = state[CALLSIGN]
+        self.origin_country = state[ORIGIN_COUNTRY]
+        self.longitude = state[LONGITUDE]
+        self.latitude = state[LATITUDE]
+        self.altitude = state[BARO_ALTITUDE]
+        self.velocity = state[VELOCITY]
+        self.track = state[TRUE_TRACK]
+
+    def saved(self):
+        '''The record as a list for flashcache.py, rounded to about a meter
+        and a degree to keep the file small.'''
+        return [self.icao24, self.callsign, self.origin_country,
+                rounded(self.longitude, 5), rounded(self.latitude, 5),
+                rounded(self.altitude, 0), rounded(self.velocity, 0), rounded(self.track, 0)]
+
+    def restore(self, saved):
+        '''Fills the record from what saved() made.'''
+        (self.icao24, self.callsign, self.origin_country, self.longitude, self.latitude, self.altitude, self.velocity, self.track) = saved
+
+    def describe(self):
+        return f'AIRCRAFT: {self.icao24} {self.callsign} from {self.origin_country} ({self.latitude}, {self.longitude}) alt: {self.altitude} speed: {self.velocity} track: {self.track}'
 
 def split_callsign(callsign):
     if callsign is None:
@@ -54,62 +122,358 @@ def split_callsign(callsign):
         was_digit = c.isdigit()
     return fields
 
-def callsign_to_color(callsign):
+# prefix_color() of common ICAO airline designators, worked out ahead of time
+# so the airlines we see the most never get hashed.
+AIRLINE_COLORS = {
+    'AAL': 0x861acf, 'ACA': 0x81d58e, 'AFR': 0x1f810e, 'ANA': 0x0724c2,
+    'ASA': 0xb800e2, 'ASH': 0xe3d7c7, 'BAW': 0x23c118, 'CPA': 0xfe9e7b,
+    'DAL': 0x05109d, 'DLH': 0x20b43c, 'ENY': 0x59c287, 'EVA': 0xe80acd,
+    'FDX': 0x72d844, 'FFT': 0xbf8300, 'GTI': 0x4a4ff8, 'HAL': 0x3c5b43,
+    'JAL': 0xdc283b, 'JBU': 0x5384fe, 'KLM': 0xae8973, 'NKS': 0x037ad8,
+    'QFA': 0xb8266d, 'QXE': 0xb164ae, 'RPA': 0xb0b036, 'SKW': 0x8d4143,
+    'SWA': 0x1015ee, 'UAE': 0x26c1f8, 'UAL': 0xa077d3, 'UPS': 0x979fe9,
+    'VXP': 0xb3227b, 'WJA': 0x0c13b9,
+}
+
+# callsign -> color for the aircraft we've drawn recently, and prefix -> color
+# for the airlines they're from, which are far fewer
+MAX_REMEMBERED_COLORS = 128
+MAX_REMEMBERED_PREFIXES = 64
+_callsign_colors = {}
+_prefix_colors = {}
+
+def remember(table, key, value, size):
+    '''Adds to a table of at most `size` entries, forgetting one entry to make
+    room, rather than all of them.'''
+    if len(table) >= size:
+        del table[next(iter(table))]
+    table[key] = value
+
+def prefix_color(prefix):
     h = hashlib.new('sha1')
-    h.update(bytearray(split_callsign(callsign)[0], 'utf8'))
+    h.update(bytearray(prefix, 'utf8'))
     return int.from_bytes(h.digest()[0:3])
 
+def callsign_to_color(callsign):
+    '''Every callsign with the same airline prefix gets the same color.'''
+    color = _callsign_colors.get(callsign)
+    if color is None:
+        prefix = split_callsign(callsign)[0]
+        color = AIRLINE_COLORS.get(prefix)
+        if color is None:
+            color = _prefix_colors.get(prefix)
+        if color is None:
+            color = prefix_color(prefix)
+            remember(_prefix_colors, prefix, color, MAX_REMEMBERED_PREFIXES)
+        remember(_callsign_colors, callsign, color, MAX_REMEMBERED_COLORS)
+    return color
+
 class OpenSky:
     '''Grabs data from OpenSky'''
-    def __init__(self, lat_min, lat_max, long_min, long_max, request_session, screen_size):
+    def __init__(self, lat_min, lat_max, long_min, long_max, request_session, screen_size,
+            base_url='https://opensky-network.org'):
         '''Retrieves data from the box denoated my that minimum and maximum
         latitudes and longitudes. South and West are negative.'''
-        self.url = f'https://opensky-network.org/api/states/all?lamin={lat_min}&lomin={long_min}&lamax={lat_max}&lomax={long_max}'
+        self.url = f'{base_url}/api/states/all?lamin={lat_min}&lomin={long_min}&lamax={lat_max}&lomax={long_max}'
         self.lat_min = float(lat_min)
         self.lat_max = float(lat_max)
         self.long_min = float(long_min)
         self.long_max = float(long_max)
-        self.request_ttl = 15 #5 * 60 # 5 minutes
+        self.request_ttl = FIRST_POLL # adapts to the traffic, see adapt_poll()
+        self.backoff = 0 # seconds waited after the last 429, 0 if it wasn't one
         self.tracks = {} # tracks oircraft grouped by icao24 transponder id
         self.track_expiration = 20 * 60 # 20 minutes
         self.screen_size = screen_size
+        self.projection = Projection(self.lat_min, self.lat_max, self.long_min, self.long_max, screen_size)
+        self.grid = Grid(screen_size, TAP_RADIUS) # where each aircraft was drawn
         self.request_session = request_session
+        self.fetcher = Fetcher(request_session, self.url, streaming=True)
         self.last_update = 0
         self.radar_group = None
+        self.error_group = None
 
-    def draw(self, timestamp):
-        '''Returns a displayio.Group and TTL in seconds for next drawing update.'''
-        print('OPENSKY draw()')
+        # Aircraft records are kept between polls. Only the first
+        # aircraft_count of them are from the latest poll.
+        self.aircraft = []
+        self.aircraft_count = 0
+        self.new_records = 0 # records allocated by the latest poll
+        self.last_ids = None # icao24s of the previous poll
+
+        # The dots of the radar group, with where each was at the poll and
+        # how fast it's moving in pixels a second. Only the first dot_count
+        # are in use.
+        self.dots = []
+        self.dot_aircraft = [] # index into self.aircraft
+        self.dot_x = []
+        self.dot_y = []
+        self.dot_vx = []
+        self.dot_vy = []
+        self.dot_count = 0
+        self.moving = False # any dot has a velocity
+        self.polled = ticks_ms() # when the aircraft were where they're drawn
+        self.shown_group = None # the group draw() returned last
+
+        self.cache = FlashCache('opensky')
+        self.stale = False # showing saved aircraft that haven't been fetched since
+        self.restore()
+
+    def restore(self):
+        '''Loads the aircraft that were saved to flash, if there are any.
+        draw() draws them.'''
+        saved = self.cache.load()
+        if saved is None:
+            return
         try:
-            if self.last_update + self.request_ttl < timestamp:
-                with self.request_session.get(self.url) as response:
-                    print('OPENSKY: data fetched.')
+            for row in saved[1]:
+                aircraft = Aircraft()
+                aircraft.restore(row)
+                self.aircraft.append(aircraft)
+        except (ValueError, TypeError) as e:
+            print(f'OPENSKY: saved aircraft are no good: {e}')
+        self.aircraft_count = len(self.aircraft)
+        self.stale = self.aircraft_count > 0
+
+    async def refresh(self, timestamp):
+        '''Fetches aircraft and rebuilds the radar group. Returns the number
+        of seconds until the next refresh.'''
+        print('OPENSKY refresh()')
+        try:
+            with span('opensky', 'network'):
+                response = await self.fetcher.get()
+            if response is None:
+                print('OPENSKY: not modified.')
+                self.last_update = timestamp
+                if self.stale:
+                    # what we have is current again, so drop the label
+                    self.stale = False
                     self.radar_group = displayio.Group()
-                    self.draw_radar(self.radar_group, response.json())
-                    print('OPENSKY update complete')
-                    self.last_update = timestamp
-            return (self.request_ttl, self.radar_group)
+                    self.draw_radar(self.radar_group)
+                self.backoff = 0
+                self.adapt_poll(0)
+                return self.request_ttl
+            with response, span('opensky', 'parse'):
+                # the body is read as it's parsed, so this includes the download
+                print('OPENSKY: fetching.')
+                chunks = self.fetcher.iter_content(response, CHUNK_SIZE)
+                await self.load_states(iter_rows(chunks, 'states', STATE_WIDTH))
+            self.polled = ticks_ms()
+            print(f'OPENSKY: {self.aircraft_count} aircraft, {self.new_records} new records, {self.fetcher.bytes_received} bytes so far')
+            self.stale = False
+            self.backoff = 0
+            self.adapt_poll(self.churn())
+            with span('opensky', 'build'):
+                radar_group = displayio.Group()
+                self.draw_radar(radar_group)
+            self.radar_group = radar_group
+            self.error_group = None
+            print('OPENSKY update complete')
+            self.last_update = timestamp
+            with span('opensky', 'save'):
+                self.cache.save(timestamp, [self.aircraft[i].saved() for i in range(self.aircraft_count)])
+            return self.request_ttl
+
+        except RateLimited as e:
+            # the aircraft we have keep moving until MAX_RECKONING
+            if e.retry_after is not None:
+                self.backoff = e.retry_after
+            else:
+                self.backoff = max(2 * self.backoff, self.request_ttl)
+            self.backoff = min(self.backoff, MAX_BACKOFF)
+            self.request_ttl = MAX_POLL
+            print(f'OPENSKY: rate limited, waiting {self.backoff} s')
+            return self.backoff
 
         except (ValueError, RuntimeError, ConnectionError, OSError) as e:
             print(f'EXCEPTION: {e}. Retrying.')
-            return (1 * 60, make_simple_text(str(e)))
+            if self.aircraft_count > 0:
+                # keep showing the last aircraft we had
+                self.stale = True
+                self.radar_group = displayio.Group()
+                self.draw_radar(self.radar_group)
+                return ERROR_TTL
+            self.error_group = make_simple_text(str(e))
+            return ERROR_TTL
 
-    def tap(self, x, y):
-        '''Takes an x,y coordinate of a tap on the touch screen and returns a
-        displayio.Group and TTL in seconds for next drawing update.'''
+    def draw(self, timestamp):
+        '''Returns a displayio.Group and TTL in seconds for next drawing
+        update. While the aircraft are moving, the group is None for frames
+        where none of their dots moved.'''
+        if self.radar_group is not None and self.radar_group is self.shown_group and self.reckoning():
+            if self.move_dots():
+                return (FRAME_SECONDS, self.radar_group)
+            return (FRAME_SECONDS, None)
+        print('OPENSKY draw()')
+        self.shown_group = None
+        if self.error_group is not None:
+            return (ERROR_TTL, self.error_group)
+        if self.radar_group is None:
+            if self.last_update == 0 and not self.stale:
+                return (1, make_simple_text('Fetching aircraft'))
+            # released, see release()
+            self.radar_group = displayio.Group()
+            self.draw_radar(self.radar_group)
+        self.shown_group = self.radar_group
+        if self.reckoning():
+            self.move_dots()
+            return (FRAME_SECONDS, self.radar_group)
         return (self.request_ttl, self.radar_group)
 
+    def release(self):
+        '''Drops the radar group. The aircraft are kept, and draw() draws
+        them again.'''
+        if self.radar_group is None:
+            return []
+        self.radar_group = None
+        self.shown_group = None
+        self.dots = []
+        self.dot_count = 0
+        self.moving = False
+        return ['radar']
+
+    def tap(self, x, y):
+        '''Shows the details of the aircraft closest to the tap for a few
+        seconds. Tapping away from every aircraft shows the radar.'''
+        idx = self.grid.nearest(x, y, TAP_RADIUS)
+        if idx is None:
+            return self.draw(0)
+        aircraft = self.aircraft[idx]
+        print(aircraft.describe())
+        self.shown_group = None # so the radar is shown again after
+        return (DETAILS_TTL, self.make_details_group(aircraft))
+
+    def make_details_group(self, aircraft):
+        color = callsign_to_color(aircraft.callsign)
+        callsign = aircraft.callsign
+        if callsign is None or len(callsign.strip()) == 0:
+            callsign = aircraft.icao24
+        altitude = '?'
+        if aircraft.altitude is not None:
+            altitude = f'{round(aircraft.altitude)} m'
+        track = '?'
+        if aircraft.track is not None:
+            track = f'{round(aircraft.track)} deg'
+        text = [callsign.strip(),
+                f'Alt: {altitude}',
+                f'Track: {track}',
+                f'From: {aircraft.origin_country}']
+        group = displayio.Group()
+        down = 0
+        for t in text:
+            group.append(make_label(t, color, 100, 140 + down))
+            down += 2 * BASE_FONT_SIZE
+        return group
+
     #########################################
-    def latlong_to_screen(self, plane_lat, plane_long):
-        x_t = linear_scale(self.long_min, plane_long, self.long_max)
-        y_t = linear_scale(self.lat_min, plane_lat, self.lat_max)
-        return (round(self.screen_size * x_t), round(self.screen_size * y_t))
-
-    def draw_radar(self, radar_group, opensky_json):
-        for raw_state in opensky_json['states']:
-            state = parse_state(raw_state)
-            coords = self.latlong_to_screen(state['latitude'], state['longitude'])
+    async def load_states(self, states):
+        '''Fills the aircraft records from state rows, only allocating records
+        when there are more aircraft than ever before. Other tasks get to run
+        every YIELD_EVERY aircraft.'''
+        self.new_records = 0
+        count = 0
+        for state in states:
+            if count == len(self.aircraft):
+                self.aircraft.append(Aircraft())
+                self.new_records += 1
+            self.aircraft[count].fill(state)
+            count += 1
+            if count % YIELD_EVERY == 0:
+                await asyncio.sleep(0)
+        self.aircraft_count = count
+
+    def churn(self):
+        '''The fraction of aircraft in this poll or the last that were only in
+        one of them. 0 for the first poll.'''
+        ids = set(self.aircraft[i].icao24 for i in range(self.aircraft_count))
+        last_ids = self.last_ids
+        self.last_ids = ids
+        if last_ids is None:
+            return 0
+        everyone = len(ids | last_ids)
+        if everyone == 0:
+            return 0
+        return len(ids ^ last_ids) / everyone
+
+    def adapt_poll(self, churn):
+        '''Polls more often when the traffic is changing, and less often when
+        it isn't, between MIN_POLL and MAX_POLL seconds.'''
+        if churn > BUSY_CHURN:
+            self.request_ttl = max(MIN_POLL, self.request_ttl // 2)
+        elif churn < QUIET_CHURN:
+            self.request_ttl = min(MAX_POLL, self.request_ttl + self.request_ttl // 2)
+        print(f'OPENSKY: {round(churn * 100)}% of aircraft changed, polling every {self.request_ttl} s')
+
+    def reckoning(self):
+        '''True while the dots are being moved between polls.'''
+        if not self.moving or self.stale:
+            return False
+        return ticks_diff(ticks_ms(), self.polled) < MAX_RECKONING * 1000
+
+    def move_dots(self):
+        '''Moves each dot to where its aircraft should be by now, and moves
+        it in the grid too. Returns True if any dot moved.'''
+        seconds = min(ticks_diff(ticks_ms(), self.polled) / 1000, MAX_RECKONING)
+        moved = False
+        for j in range(self.dot_count):
+            dot = self.dots[j]
+            x = round(self.dot_x[j] + self.dot_vx[j] * seconds)
+            y = round(self.dot_y[j] + self.dot_vy[j] * seconds)
+            if x == dot.x0 and y == dot.y0:
+                continue
+            self.grid.move(self.dot_aircraft[j], dot.x0, dot.y0, x, y)
+            if x != dot.x0:
+                dot.x0 = x
+            if y != dot.y0:
+                dot.y0 = y
+            moved = True
+        return moved
+
+    def draw_radar(self, radar_group):
+        '''Draws every aircraft inside the box. Aircraft outside of it, or
+        without a position, are skipped.'''
+        (xs, ys) = self.projection.project(self.aircraft, self.aircraft_count)
+        self.grid.clear()
+        self.moving = False
+        self.dots = []
+        culled = 0
+        for i in range(self.aircraft_count):
+            x = xs[i]
+            y = ys[i]
+            if not self.projection.on_screen(x, y):
+                culled += 1
+                continue
+            x = round(x)
+            y = round(y)
+            self.grid.insert(i, x, y)
+            aircraft = self.aircraft[i]
             radius = 4
             stroke = 1
-            color = callsign_to_color(state['callsign'])
-            radar_group.append(Circle(x0=coords[0], y0=coords[1], r=radius, fill=color, outline=color, stroke=stroke))
+            color = callsign_to_color(aircraft.callsign)
+            dot = Circle(x0=x, y0=y, r=radius, fill=color, outline=color, stroke=stroke)
+            radar_group.append(dot)
+            self.add_dot(dot, i, x, y)
+        self.dot_count = len(self.dots)
+        if culled > 0:
+            print(f'OPENSKY: {culled} aircraft off the screen')
+        if self.stale:
+            radar_group.append(make_stale_label(self.screen_size))
+
+    def add_dot(self, dot, idx, x, y):
+        '''Remembers a dot and its velocity for move_dots(). The lists of
+        numbers are reused from poll to poll.'''
+        j = len(self.dots)
+        self.dots.append(dot)
+        (vx, vy) = self.projection.velocity(self.aircraft[idx])
+        if vx != 0 or vy != 0:
+            self.moving = True
+        if j == len(self.dot_x):
+            self.dot_aircraft.append(idx)
+            self.dot_x.append(x)
+            self.dot_y.append(y)
+            self.dot_vx.append(vx)
+            self.dot_vy.append(vy)
+        else:
+            self.dot_aircraft[j] = idx
+            self.dot_x[j] = x
+            self.dot_y[j] = y
+            self.dot_vx[j] = vx
+            self.dot_vy[j] = vy
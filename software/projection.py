@@ -0,0 +1,103 @@
+# Guy
+# projection.py
+# Copyright 2025, Jonathan Koren
+# Licensed under the Gnu Public License v3
+#
+# Turns the latitudes and longitudes of every aircraft into screen coordinates
+# at once. With ulab (or NumPy on a computer) the arithmetic is done on whole
+# arrays. Without it, it's done one aircraft at a time in the same pass.
+#
+# Aircraft without a position are given NaN coordinates, which are never on
+# the screen, so nothing has to raise or special-case them later.
+
+try:
+    from ulab import numpy as np
+except ImportError:
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+
+from math import cos, radians, sin
+
+NAN = float('nan')
+METERS_PER_DEGREE = 111320 # of latitude, or of longitude at the equator
+
+class Projection:
+    '''Maps a latitude and longitude box onto a square screen. The minimum
+    longitude is at x = 0 and the minimum latitude at y = 0.'''
+    def __init__(self, lat_min, lat_max, long_min, long_max, screen_size):
+        self.lat_min = lat_min
+        self.long_min = long_min
+        self.screen_size = screen_size
+        self.x_scale = screen_size / (long_max - long_min)
+        self.y_scale = screen_size / (lat_max - lat_min)
+        # Reused from frame to frame, and only grown when there are more
+        # aircraft than ever before.
+        self.capacity = 0
+        self.longs = None
+        self.lats = None
+        self.xs = None
+        self.ys = None
+
+    def grow(self, count):
+        capacity = max(count, 2 * self.capacity, 16)
+        if np is not None:
+            self.longs = np.zeros(capacity)
+            self.lats = np.zeros(capacity)
+        else:
+            self.xs = [NAN] * capacity
+            self.ys = [NAN] * capacity
+        self.capacity = capacity
+
+    def project(self, aircraft, count):
+        '''Returns arrays of x and y coordinates for the first `count`
+        aircraft. Only the first `count` entries are meaningful, and they're
+        overwritten by the next call.'''
+        if count > self.capacity:
+            self.grow(count)
+        if np is None:
+            return self.project_each(aircraft, count)
+
+        longs = self.longs
+        lats = self.lats
+        for i in range(count):
+            a = aircraft[i]
+            if a.longitude is None or a.latitude is None:
+                longs[i] = NAN
+                lats[i] = NAN
+            else:
+                longs[i] = a.longitude
+                lats[i] = a.latitude
+        xs = (longs[:count] - self.long_min) * self.x_scale
+        ys = (lats[:count] - self.lat_min) * self.y_scale
+        return (xs, ys)
+
+    def project_each(self, aircraft, count):
+        xs = self.xs
+        ys = self.ys
+        for i in range(count):
+            a = aircraft[i]
+            if a.longitude is None or a.latitude is None:
+                xs[i] = NAN
+                ys[i] = NAN
+            else:
+                xs[i] = (a.longitude - self.long_min) * self.x_scale
+                ys[i] = (a.latitude - self.lat_min) * self.y_scale
+        return (xs, ys)
+
+    def velocity(self, a):
+        '''How fast an aircraft crosses the screen, in pixels a second, going
+        by its speed and track. (0, 0) if either isn't known.'''
+        if a.velocity is None or a.track is None or a.latitude is None:
+            return (0, 0)
+        track = radians(a.track) # clockwise from north
+        north = a.velocity * cos(track)
+        east = a.velocity * sin(track)
+        vx = east / (METERS_PER_DEGREE * cos(radians(a.latitude))) * self.x_scale
+        vy = north / METERS_PER_DEGREE * self.y_scale
+        return (vx, vy)
+
+    def on_screen(self, x, y):
+        '''False for coordinates outside of the box, and for NaN.'''
+        return 0 <= x <= self.screen_size and 0 <= y <= self.screen_size
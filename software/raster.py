@@ -0,0 +1,303 @@
+# Guy
+# raster.py
+# Copyright 2025, Jonathan Koren
+# Licensed under the Gnu Public License v3
+#
+# A stand-in for displayio and adafruit_display_shapes for CPython, so that
+# faces can be drawn and timed on a computer. Shapes are drawn into NumPy
+# bitmaps of palette indices when they're made, the same way the real shapes
+# are, and a Framebuffer puts a group of them together into pixels.
+#
+# Only what chernoff.py uses is here. This is never copied to the ESP32.
+
+import numpy as np
+
+class Palette:
+    def __init__(self, color_count):
+        self.colors = [0] * color_count
+        self.transparent = [False] * color_count
+
+    def __len__(self):
+        return len(self.colors)
+
+    def __getitem__(self, index):
+        return self.colors[index]
+
+    def __setitem__(self, index, color):
+        self.colors[index] = color
+
+    def make_transparent(self, index):
+        self.transparent[index] = True
+
+    def make_opaque(self, index):
+        self.transparent[index] = False
+
+class Group:
+    def __init__(self, x=0, y=0):
+        self.x = x
+        self.y = y
+        self.hidden = False
+        self.children = []
+
+    def __len__(self):
+        return len(self.children)
+
+    def __getitem__(self, index):
+        return self.children[index]
+
+    def append(self, child):
+        self.children.append(child)
+
+    def insert(self, index, child):
+        self.children.insert(index, child)
+
+    def remove(self, child):
+        self.children.remove(child)
+
+    def pop(self, index=-1):
+        return self.children.pop(index)
+
+class TileGrid:
+    '''One bitmap of palette indices placed at x, y.'''
+    def __init__(self, bitmap, pixel_shader, x=0, y=0):
+        self.bitmap = bitmap
+        self.pixel_shader = pixel_shader
+        self.x = x
+        self.y = y
+        self.hidden = False
+
+    def pixels(self):
+        '''Returns the bitmap and which palette index to use for each pixel.'''
+        return self.bitmap
+
+###############################################################################
+# Rasterizing helpers
+
+def rounded_rect_mask(width, height, r, inset=0):
+    '''True for every pixel inside a rounded rectangle, shrunk by `inset`.'''
+    ys, xs = np.mgrid[0:height, 0:width]
+    r = max(r - inset, 0)
+    left = inset + r
+    right = width - 1 - inset - r
+    top = inset + r
+    bottom = height - 1 - inset - r
+    cx = np.clip(xs, left, right)
+    cy = np.clip(ys, top, bottom)
+    inside = (xs >= inset) & (xs <= width - 1 - inset) & (ys >= inset) & (ys <= height - 1 - inset)
+    return inside & ((xs - cx) ** 2 + (ys - cy) ** 2 <= r * r + r)
+
+def polygon_mask(points, width, height):
+    '''True for every pixel whose center is inside the polygon (even-odd rule).
+    Points are relative to the bitmap.'''
+    ys, xs = np.mgrid[0:height, 0:width]
+    xs = xs + 0.5
+    ys = ys + 0.5
+    inside = np.zeros((height, width), dtype=bool)
+    n = len(points)
+    for i in range(n):
+        (x0, y0) = points[i]
+        (x1, y1) = points[(i + 1) % n]
+        if y0 == y1:
+            continue
+        crosses = (ys >= min(y0, y1)) & (ys < max(y0, y1))
+        x_at = x0 + (ys - y0) * (x1 - x0) / (y1 - y0)
+        inside ^= crosses & (xs < x_at)
+    return inside
+
+def draw_line(bitmap, p0, p1, color_index):
+    '''Bresenham line, clipped to the bitmap.'''
+    (x0, y0) = p0
+    (x1, y1) = p1
+    steps = max(abs(x1 - x0), abs(y1 - y0))
+    if steps == 0:
+        xs = np.array([x0])
+        ys = np.array([y0])
+    else:
+        t = np.arange(steps + 1) / steps
+        xs = np.rint(x0 + (x1 - x0) * t).astype(int)
+        ys = np.rint(y0 + (y1 - y0) * t).astype(int)
+    keep = (xs >= 0) & (xs < bitmap.shape[1]) & (ys >= 0) & (ys < bitmap.shape[0])
+    bitmap[ys[keep], xs[keep]] = color_index
+
+###############################################################################
+# Shapes
+
+OUTLINE = 1
+FILL = 2
+
+def shape_palette(fill, outline):
+    palette = Palette(3)
+    palette.make_transparent(0)
+    for (index, color) in ((FILL, fill), (OUTLINE, outline)):
+        if color is None:
+            palette.make_transparent(index)
+        else:
+            palette[index] = color
+    return palette
+
+class RoundRect(TileGrid):
+    def __init__(self, x, y, width, height, r, *, fill=None, outline=None, stroke=1):
+        bitmap = np.zeros((height, width), dtype=np.uint8)
+        outer = rounded_rect_mask(width, height, r)
+        inner = rounded_rect_mask(width, height, r, stroke)
+        bitmap[inner] = FILL
+        if outline is not None:
+            bitmap[outer & ~inner] = OUTLINE
+        super().__init__(bitmap, shape_palette(fill, outline), x, y)
+
+class Circle(RoundRect):
+    def __init__(self, x0, y0, r, *, fill=None, outline=None, stroke=1):
+        super().__init__(x0 - r, y0 - r, 2 * r + 1, 2 * r + 1, r,
+                fill=fill, outline=outline, stroke=stroke)
+        self.r = r
+
+    @property
+    def x0(self):
+        return self.x + self.r
+
+    @x0.setter
+    def x0(self, x0):
+        self.x = x0 - self.r
+
+    @property
+    def y0(self):
+        return self.y + self.r
+
+    @y0.setter
+    def y0(self, y0):
+        self.y = y0 - self.r
+
+class Polygon(TileGrid):
+    '''An outline through the points.'''
+    def __init__(self, points, *, outline=None, close=True, stroke=1):
+        xs = [p[0] for p in points]
+        ys = [p[1] for p in points]
+        x_offset = min(xs)
+        y_offset = min(ys)
+        bitmap = np.zeros((max(ys) - y_offset + stroke, max(xs) - x_offset + stroke), dtype=np.uint8)
+        shifted = [(x - x_offset, y - y_offset) for (x, y) in points]
+        if close:
+            shifted.append(shifted[0])
+        if outline is not None:
+            for i in range(len(shifted) - 1):
+                draw_line(bitmap, shifted[i], shifted[i + 1], OUTLINE)
+        super().__init__(bitmap, shape_palette(None, outline), x_offset, y_offset)
+
+class Line(Polygon):
+    def __init__(self, x0, y0, x1, y1, color):
+        super().__init__([(x0, y0), (x1, y1)], outline=color)
+
+class VectorPolygon:
+    '''Like vectorio.Polygon: a filled polygon drawn in one palette color.'''
+    def __init__(self, pixel_shader, points, x=0, y=0, color_index=0):
+        self.pixel_shader = pixel_shader
+        self.color_index = color_index
+        self.x = x
+        self.y = y
+        self.hidden = False
+        self.points = points
+
+    @property
+    def points(self):
+        return self._points
+
+    @points.setter
+    def points(self, points):
+        self._points = list(points)
+        xs = [p[0] for p in points]
+        ys = [p[1] for p in points]
+        self.left = min(xs)
+        self.top = min(ys)
+        shifted = [(x - self.left, y - self.top) for (x, y) in points]
+        self.mask = polygon_mask(shifted, max(xs) - self.left + 1, max(ys) - self.top + 1)
+
+    def pixels(self):
+        return self.mask.astype(np.uint8) * self.color_index
+
+class FilledPolygon(Group):
+    def __init__(self, points, *, outline=None, fill=None, close=True, stroke=1):
+        super().__init__()
+        self.palette = None
+        self.vector_polygon = None
+        if fill is not None:
+            self.palette = Palette(1)
+            self.palette[0] = fill
+            self.vector_polygon = VectorPolygon(self.palette, points)
+            self.append(self.vector_polygon)
+        if outline is not None:
+            self.append(Polygon(points, outline=outline, close=close, stroke=stroke))
+
+    @property
+    def points(self):
+        return self.vector_polygon.points
+
+    @points.setter
+    def points(self, points):
+        self.vector_polygon.points = points
+
+###############################################################################
+
+class Framebuffer:
+    '''The pixels of a display, as 0xRRGGBB.'''
+    def __init__(self, width, height, background=0):
+        self.background = background
+        self.pixels = np.full((height, width), background, dtype=np.uint32)
+
+    def clear(self):
+        self.pixels[:] = self.background
+
+    def render(self, group, x=0, y=0):
+        '''Draws the group and everything in it.'''
+        if group.hidden:
+            return
+        x += group.x
+        y += group.y
+        for child in group:
+            if isinstance(child, Group):
+                self.render(child, x, y)
+            else:
+                self.blit(child, x, y)
+
+    def blit(self, shape, x, y):
+        if shape.hidden:
+            return
+        indices = shape.pixels()
+        palette = shape.pixel_shader
+        if isinstance(shape, VectorPolygon):
+            x += shape.left
+            y += shape.top
+            opaque = shape.mask.copy()
+        else:
+            opaque = np.ones(indices.shape, dtype=bool)
+        x += shape.x
+        y += shape.y
+
+        colors = np.array(palette.colors, dtype=np.uint32)[indices]
+        transparent = np.array(palette.transparent, dtype=bool)[indices]
+        opaque &= ~transparent
+
+        # clip to the framebuffer
+        (height, width) = self.pixels.shape
+        left = max(0, -x)
+        top = max(0, -y)
+        right = min(indices.shape[1], width - x)
+        bottom = min(indices.shape[0], height - y)
+        if left >= right or top >= bottom:
+            return
+        region = self.pixels[y + top:y + bottom, x + left:x + right]
+        keep = opaque[top:bottom, left:right]
+        region[keep] = colors[top:bottom, left:right][keep]
+
+    def coverage(self):
+        '''Fraction of pixels that aren't the background.'''
+        return float(np.count_nonzero(self.pixels != self.background)) / self.pixels.size
+
+def count_shapes(group):
+    '''Number of bitmaps and polygons in a group, including nested groups.'''
+    count = 0
+    for child in group:
+        if isinstance(child, Group):
+            count += count_shapes(child)
+        else:
+            count += 1
+    return count
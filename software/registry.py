@@ -0,0 +1,98 @@
+# Guy
+# registry.py
+# Copyright 2025, Jonathan Koren
+# Licensed under the Gnu Public License v3
+#
+# Which modules Guy runs, and how each one is made. GUY_MODULES in
+# settings.toml lists them by name, in the order they're swiped through:
+#
+#   GUY_MODULES = "faceanimation,weather,opensky,diagnostics"
+#
+# A module isn't imported, and its class isn't made, until it's first drawn,
+# tapped, or refreshed. The first one is on the screen before the others and
+# their display libraries take any time or heap. To add a module of your own,
+# write a make_ function for it and add it to REGISTRY.
+
+from diagnostics import Timed, span
+
+DEFAULT_MODULES = 'faceanimation,weather,opensky,diagnostics'
+
+def make_faceanimation(size, requests, getenv):
+    from faceanimation import FaceAnimation
+    return FaceAnimation(size)
+
+def make_weather(size, requests, getenv):
+    from weather import Weather
+    return Weather(getenv('WEATHER_URL'), requests, size)
+
+def make_opensky(size, requests, getenv):
+    from opensky import OpenSky
+    return OpenSky(getenv('OPENSKY_LAT_MIN'), getenv('OPENSKY_LAT_MAX'),
+        getenv('OPENSKY_LONG_MIN'), getenv('OPENSKY_LONG_MAX'),
+        requests, size,
+        getenv('OPENSKY_URL', 'https://opensky-network.org'))
+
+def make_diagnostics(size, requests, getenv):
+    from diagnostics import Diagnostics
+    return Diagnostics()
+
+# name -> (make function, has refresh(), timed by diagnostics.Timed)
+REGISTRY = {
+    'faceanimation': (make_faceanimation, False, True),
+    'weather': (make_weather, True, True),
+    'opensky': (make_opensky, True, True),
+    'diagnostics': (make_diagnostics, False, False),
+}
+
+class LazyModule:
+    '''Stands in for a module and makes it the first time it's used.'''
+    def __init__(self, name, make, size, requests, getenv, refreshes):
+        self.name = name
+        self.make = make
+        self.size = size
+        self.requests = requests
+        self.getenv = getenv
+        self.module = None
+        if refreshes:
+            # only modules that refresh get a refresh(), see MainLoop.reset()
+            self.refresh = self.lazy_refresh
+
+    def load(self):
+        if self.module is None:
+            with span(self.name, 'load'):
+                self.module = self.make(self.size, self.requests, self.getenv)
+        return self.module
+
+    def draw(self, timestamp):
+        return self.load().draw(timestamp)
+
+    def tap(self, x, y):
+        return self.load().tap(x, y)
+
+    async def lazy_refresh(self, timestamp):
+        return await self.load().refresh(timestamp)
+
+    def release(self):
+        '''Releases the module's groups, but never loads it to do so.'''
+        if self.module is None or not hasattr(self.module, 'release'):
+            return []
+        return self.module.release()
+
+def load_modules(names, size, requests, getenv):
+    '''Returns a LazyModule for each of the comma separated names, or for
+    DEFAULT_MODULES if names is None. Unknown names are skipped.'''
+    if not names:
+        names = DEFAULT_MODULES
+    modules = []
+    for name in names.split(','):
+        name = name.strip().lower()
+        entry = REGISTRY.get(name)
+        if entry is None:
+            print(f'REGISTRY: no module named {repr(name)}')
+            continue
+        (make, refreshes, timed) = entry
+        module = LazyModule(name, make, size, requests, getenv, refreshes)
+        if timed:
+            module = Timed(module, name)
+        modules.append(module)
+    return modules
@@ -0,0 +1,91 @@
+# Guy
+# scheduler.py
+# Copyright 2025, Jonathan Koren
+# Licensed under the Gnu Public License v3
+#
+# Keeps track of when things need to happen next and sleeps until then, rather
+# than checking the clock as fast as the CPU allows. time.time() only counts
+# whole seconds, so deadlines are kept in milliseconds with adafruit_ticks.
+
+import asyncio
+
+from adafruit_ticks import ticks_ms, ticks_add, ticks_diff
+
+TOUCH_POLL_MS = 50 # how often the touch screen is checked while sleeping
+DUTY_REPORT_MS = 60 * 1000 # how often the duty cycle is printed
+
+class Scheduler:
+    def __init__(self):
+        self.deadlines = {} # name -> ticks_ms() it's due
+        self.woke = ticks_ms()
+        self.period_start = self.woke
+        self.awake_ms = 0 # since period_start
+        self.wakeups = 0 # since period_start
+        self.duty_cycle = 0 # fraction of the last period spent awake
+
+    def set(self, name, seconds):
+        '''Makes `name` due `seconds` from now.'''
+        self.deadlines[name] = ticks_add(ticks_ms(), int(seconds * 1000))
+
+    def clear(self, name):
+        '''Forgets about `name` until it's set() again.'''
+        if name in self.deadlines:
+            del self.deadlines[name]
+
+    def due(self, name):
+        '''True if `name` has been set and its time has come.'''
+        deadline = self.deadlines.get(name)
+        return deadline is not None and ticks_diff(deadline, ticks_ms()) <= 0
+
+    def ready(self, name):
+        '''True unless `name` is set and not due yet. A due deadline is
+        cleared so that it doesn't keep waking the scheduler.'''
+        if name not in self.deadlines:
+            return True
+        if self.due(name):
+            self.clear(name)
+            return True
+        return False
+
+    def ms_until_next(self):
+        '''Milliseconds until the next deadline, or None if there aren't any.'''
+        now = ticks_ms()
+        soonest = None
+        for deadline in self.deadlines.values():
+            ms = max(0, ticks_diff(deadline, now))
+            if soonest is None or ms < soonest:
+                soonest = ms
+        return soonest
+
+    def busy(self, ms):
+        '''Counts work done outside of the main loop (e.g. fetching) as time
+        spent awake.'''
+        self.awake_ms += ms
+
+    async def sleep(self, touch):
+        '''Sleeps until the next deadline or until the screen is touched.'''
+        self.awake_ms += ticks_diff(ticks_ms(), self.woke)
+        while True:
+            remaining = self.ms_until_next()
+            if remaining == 0:
+                # let the refresh tasks run even when a deadline is due
+                await asyncio.sleep(0)
+                break
+            if remaining is None or remaining > TOUCH_POLL_MS:
+                remaining = TOUCH_POLL_MS
+            await asyncio.sleep(remaining / 1000)
+            if touch.touched:
+                break
+        self.woke = ticks_ms()
+        self.wakeups += 1
+        self.report()
+
+    def report(self):
+        elapsed = ticks_diff(self.woke, self.period_start)
+        if elapsed < DUTY_REPORT_MS:
+            return
+        self.duty_cycle = min(1, self.awake_ms / elapsed)
+        print(f'SCHEDULER: awake {100 * self.duty_cycle:.1f}% of {elapsed // 1000}s, {self.wakeups} wakeups')
+        self.period_start = self.woke
+        self.awake_ms = 0
+        self.wakeups = 0
@@ -0,0 +1,52 @@
+# Guy
+# sparkline.py
+# Copyright 2025, Jonathan Koren
+# Licensed under the Gnu Public License v3
+#
+# Draws columns of a History as lines into a displayio.Bitmap, so that any
+# number of them take one bitmap instead of a shape per point.
+
+try:
+    import bitmaptools
+except ImportError:
+    bitmaptools = None
+
+from history import is_nan
+
+def draw_line(bitmap, x0, y0, x1, y1, color_index):
+    if bitmaptools is not None:
+        bitmaptools.draw_line(bitmap, x0, y0, x1, y1, color_index)
+        return
+    steps = max(abs(x1 - x0), abs(y1 - y0), 1)
+    for i in range(steps + 1):
+        bitmap[x0 + (x1 - x0) * i // steps, y0 + (y1 - y0) * i // steps] = color_index
+
+def draw_sparkline(bitmap, history, name, top, height, since, now, color_index):
+    '''Draws the column `name` from `since` to `now` across the whole width of
+    the bitmap, in the rows from `top` to `top + height - 1`. The line is
+    scaled to fill the rows, and broken wherever a value is missing. Returns
+    the smallest and largest values drawn, or None if there weren't any.'''
+    value_range = history.value_range(name, since)
+    if value_range is None or now <= since:
+        return None
+    (low, high) = value_range
+    width = bitmap.width
+    values = history.column(name)
+    previous = None
+    for i in range(history.count):
+        idx = history.index(i)
+        t = history.times[idx]
+        value = values[idx]
+        if t < since or is_nan(value):
+            previous = None
+            continue
+        x = min(width - 1, (t - since) * (width - 1) // (now - since))
+        y = top + height // 2
+        if high > low:
+            y = top + height - 1 - round((value - low) * (height - 1) / (high - low))
+        if previous is None:
+            bitmap[x, y] = color_index
+        else:
+            draw_line(bitmap, previous[0], previous[1], x, y, color_index)
+        previous = (x, y)
+    return value_range
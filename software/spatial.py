@@ -0,0 +1,76 @@
+# Guy
+# spatial.py
+# Copyright 2025, Jonathan Koren
+# Licensed under the Gnu Public License v3
+#
+# A uniform grid over the screen, so that finding what was drawn near a point
+# only looks at the few cells around it, no matter how many things there are.
+
+class Grid:
+    '''Square cells of `cell_size` pixels covering a `size` by `size` screen.
+    Each cell is a flat list of index, x, y triples, so adding a point doesn't
+    allocate a tuple. The cells are kept and emptied between frames.'''
+    def __init__(self, size, cell_size):
+        self.cell_size = cell_size
+        self.columns = (size + cell_size - 1) // cell_size
+        self.cells = [[] for _ in range(self.columns * self.columns)]
+        self.count = 0
+
+    def clear(self):
+        for cell in self.cells:
+            if len(cell) > 0:
+                cell.clear()
+        self.count = 0
+
+    def cell_index(self, column, row):
+        column = min(max(column, 0), self.columns - 1)
+        row = min(max(row, 0), self.columns - 1)
+        return row * self.columns + column
+
+    def insert(self, index, x, y):
+        '''Remembers that item `index` is at x, y.'''
+        cell = self.cells[self.cell_index(x // self.cell_size, y // self.cell_size)]
+        cell.append(index)
+        cell.append(x)
+        cell.append(y)
+        self.count += 1
+
+    def move(self, index, old_x, old_y, x, y):
+        '''Moves item `index` from old_x, old_y to x, y. Only the cells it
+        was in and is going to are touched.'''
+        old = self.cells[self.cell_index(old_x // self.cell_size, old_y // self.cell_size)]
+        new = self.cells[self.cell_index(x // self.cell_size, y // self.cell_size)]
+        for i in range(0, len(old), 3):
+            if old[i] == index and old[i + 1] == old_x and old[i + 2] == old_y:
+                if old is new:
+                    old[i + 1] = x
+                    old[i + 2] = y
+                    return
+                del old[i:i + 3]
+                self.count -= 1
+                break
+        self.insert(index, x, y)
+
+    def nearest(self, x, y, radius):
+        '''Returns the index of the item closest to x, y, or None if nothing is
+        within `radius` pixels. `radius` should be no more than `cell_size`,
+        so only the 3x3 cells around the point are searched.'''
+        column = x // self.cell_size
+        row = y // self.cell_size
+        best = None
+        best_distance = radius * radius
+        for r in range(row - 1, row + 2):
+            if r < 0 or r >= self.columns:
+                continue
+            for c in range(column - 1, column + 2):
+                if c < 0 or c >= self.columns:
+                    continue
+                cell = self.cells[r * self.columns + c]
+                for i in range(0, len(cell), 3):
+                    dx = cell[i + 1] - x
+                    dy = cell[i + 2] - y
+                    distance = dx * dx + dy * dy
+                    if distance <= best_distance:
+                        best = cell[i]
+                        best_distance = distance
+        return best
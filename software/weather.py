@@ -3,60 +3,126 @@
 # Copyright 2025, Jonathan Koren
 # Licensed under the Gnu Public License v3
 
+import asyncio
 import displayio
 import json
 
-from adafruit_display_text import label
-from adafruit_bitmap_font import bitmap_font
-
+from animation import Animator, Pose
 from chernoff import Face, Emotion, bound_pupil_to_eye
+from diagnostics import span
+from fetch import Fetcher
+from flashcache import STALE_TEXT, FlashCache, make_stale_label
+from fonts import BASE_FONT_SIZE, make_label, make_simple_text
+from history import History
+from sparkline import draw_sparkline
+from weathersnapshot import WeatherSnapshot
+
+ERROR_TTL = 60 # seconds before retrying a failed fetch
+DEFAULT_COLOR = 0xffffff # face color when the air quality isn't known
+
+# What tapping cycles through
+FACE_VIEW = 0
+TEXT_VIEW = 1
+HISTORY_VIEW = 2
+VIEW_COUNT = 3
+
+# A day of fetches, five minutes apart
+HISTORY_SECONDS = 24 * 60 * 60
+HISTORY_SIZE = 288
+# Name in the History, label, and color of each sparkline
+HISTORY_COLUMNS = ['temperature', 'humidity', 'wind', 'aqi']
+HISTORY_LABELS = ['Temp', 'Humidity', 'Wind', 'AQI']
+HISTORY_COLORS = [0xff8000, 0x00a0ff, 0xffffff, 0x00e400]
+SPARKLINE_WIDTH = 320
+SPARKLINE_HEIGHT = 40
+SPARKLINE_SPACING = 60 # from the top of one sparkline to the next
+
+# The pupils look up when it's warmed up by this many degrees over this many
+# seconds, and down when it's cooled off.
+TREND_DEGREES = 2
+TREND_SECONDS = 3 * 60 * 60
 
 def clamp(low, val, high):
     return min(max(val, low), high)
 
-def make_simple_text(text):
-    '''Creates a displayio.Group that shows a simple line of text.'''
-    group = displayio.Group()
-    BASE_FONT_SIZE = 24
-    font = bitmap_font.load_font(f"Junction-Regular-{BASE_FONT_SIZE}.pcf", displayio.Bitmap)
-    font_scale = 1
-    color = 0xFF0000
-    text_area = label.Label(font, text=text, color=color, scale=font_scale)
-    text_area.x = 100
-    text_area.y = 100
-    group.append(text_area)
-    return group
-
 class Weather:
     def __init__(self, url, request_session, face_size):
         self.url = url
         self.requests = request_session
-        self.show_face = True
+        self.fetcher = Fetcher(request_session, url)
+        self.view = FACE_VIEW
         self.ttl = 5 * 60 # five minutes
-        self.datajson = None
+        self.snapshot = None # WeatherSnapshot of the latest fetch
         self.face = Face(face_size)
+        self.animator = Animator(self.face)
         self.face_group = None
         self.text_group = None
+        self.history = History(HISTORY_COLUMNS, HISTORY_SIZE)
+        self.history_bitmap = None
+        self.history_group = None # rebuilt when it's next shown
         self.last_update = 0
+        self.cache = FlashCache('weather')
+        self.stale = False # showing saved data that hasn't been fetched since
+        self.stale_label = None
+        self.restore()
 
-    def draw(self, timestamp):
-        print('WEATHER: draw()')
-        self.face.reset()
+    def restore(self):
+        '''Loads the last weather that was saved to flash, if there is any.
+        draw() builds the groups from it.'''
+        saved = self.cache.load()
+        if saved is None:
+            return
         try:
-            if self.last_update + self.ttl < timestamp:
-                with self.requests.get(self.url) as response:
-                    self.datajson = response.json()
-                    print('WEATHER: data fetched.')
-                    self.make_face_group()
+            self.snapshot = WeatherSnapshot(saved[1])
+            self.stale = True
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            print(f'WEATHER: saved weather is no good: {e}')
+
+    async def refresh(self, timestamp):
+        '''Fetches the weather and rebuilds the face and text groups. Returns
+        the number of seconds until the next refresh.'''
+        print('WEATHER: refresh()')
+        try:
+            with span('weather', 'network'):
+                response = await self.fetcher.get()
+            if response is None:
+                print('WEATHER: not modified.')
+                self.last_update = timestamp
+                if self.stale:
+                    # what we have is current again
+                    self.stale = False
+                    if self.face_group is not None:
+                        self.mark_stale()
                     self.make_text_view_group()
-                    self.last_update = timestamp
+                return self.ttl
+            with response, span('weather', 'parse'):
+                datajson = await self.fetcher.json(response)
+                self.snapshot = WeatherSnapshot(datajson)
+            self.stale = False
+            self.add_to_history(timestamp)
+            print(f'WEATHER: data fetched. {self.fetcher.bytes_received} bytes so far')
+            await asyncio.sleep(0)
 
-                    print('WEATHER: face updated')
-            return self.current_display_group()
+            with span('weather', 'build'):
+                self.face.emotion = None
+                self.make_face_group()
+                self.make_text_view_group()
+            self.last_update = timestamp
+            print('WEATHER: face updated')
+            with span('weather', 'save'):
+                self.cache.save(timestamp, datajson)
+            return self.ttl
 
         except (ValueError, RuntimeError, ConnectionError, OSError) as e:
             print(f'EXCEPTION: {e}. Retrying.')
-            text = f'Error fetching from {self.url}'
+            if self.snapshot is not None:
+                # keep showing the last weather we had
+                self.stale = True
+                if self.face_group is None:
+                    self.make_face_group()
+                self.mark_stale()
+                self.make_text_view_group()
+                return ERROR_TTL
 
             # make face
             self.face.emotion = Emotion.CONFUSED
@@ -66,26 +132,62 @@ class Weather:
 
             # make text
             self.text_group = make_simple_text(str(e))
+            return ERROR_TTL
 
-            return self.current_display_group()
+    def draw(self, timestamp):
+        '''Shows whatever refresh() built last.'''
+        print('WEATHER: draw()')
+        if self.face_group is None and self.text_group is None:
+            if self.snapshot is None:
+                return (1, make_simple_text('Fetching weather'))
+            # released, see release()
+            self.make_face_group()
+            self.make_text_view_group()
+        return self.current_display_group()
+
+    def release(self):
+        '''Drops every group. The snapshot and history are kept, and draw()
+        builds the groups from them again.'''
+        released = []
+        if self.face_group is not None:
+            self.animator.cancel()
+            self.face.release()
+            self.face_group = None
+            self.stale_label = None
+            released.append('face')
+        if self.text_group is not None:
+            self.text_group = None
+            released.append('text')
+        if self.history_group is not None:
+            self.history_group = None
+            self.history_bitmap = None
+            released.append('history')
+        return released
 
     def tap(self, x, y):
-        '''Switches between face and text mode.'''
-        if self.datajson is None:
+        '''Cycles between the face, text, and history views.'''
+        if self.snapshot is None:
             return (1, make_simple_text('Nothing fetched'))
 
-        self.show_face = not self.show_face
-        if self.show_face:
-            return (self.ttl, self.face_group)
-        else:
-            return (self.ttl, self.text_group)
+        self.view = (self.view + 1) % VIEW_COUNT
+        return self.current_display_group()
 
     #####################################################
     def current_display_group(self):
-        if self.show_face:
-            return (self.ttl, self.face_group)
-        else:
+        if self.view != FACE_VIEW:
+            # nobody's watching the face change
+            self.animator.finish()
+        if self.view == TEXT_VIEW:
             return (self.ttl, self.text_group)
+        elif self.view == HISTORY_VIEW:
+            if self.history_group is None:
+                self.make_history_group()
+            return (self.ttl, self.history_group)
+        else:
+            ttl = self.animator.step()
+            if ttl is not None:
+                return (ttl, self.face_group)
+            return (self.ttl, self.face_group)
 
     #####################################################
     def make_confused(self):
@@ -93,20 +195,13 @@ class Weather:
         self.face.color = 0xffff00
 
     def make_face_temp(self):
-        windchill = round(float(self.datajson['Wind Chill'].split('&')[0]))
-        heatindex = round(float(self.datajson['Heat Index'].split('&')[0]))
-        airtemp = round(float(self.datajson['Outside Temperature'].split('&')[0]))
-
-        usable_temp = airtemp
-        if windchill < airtemp * 0.9:
-            usable_temp = windchill
-        elif heatindex > airtemp * 1.1:
-            usable_temp = heatindex
-
         MIN_SIZE = 20
         MAX_SIZE = 100
         self.face.nose.height = MIN_SIZE
         self.face.nose.width = MIN_SIZE
+        usable_temp = self.snapshot.feels_like()
+        if usable_temp is None:
+            return
         if usable_temp > 0:
             self.face.nose.height = round(usable_temp) + 20
             if self.face.nose.height > MAX_SIZE:
@@ -119,79 +214,150 @@ class Weather:
                 self.face.nose.width = MAX_SIZE
 
     def make_face_humid(self):
-        humidity = float(self.datajson['Humidity'].split('%')[0]) / 100.0
+        if self.snapshot.humidity is None:
+            return
+        humidity = self.snapshot.humidity / 100.0
         for i in range(len(self.face.eyes)):
             offset = round(humidity * (2 * self.face.eyes[i].radius))
             self.face.pupils[i].x = self.face.eyes[i].x - self.face.eyes[i].radius + offset
             bound_pupil_to_eye(self.face.eyes[i], self.face.pupils[i])
 
     def make_face_aqi(self):
-        self.face.color = int(self.datajson['Current AQI PM 2.5 color'][1:], 16)
+        self.face.color = DEFAULT_COLOR
+        if self.snapshot.aqi_color is not None:
+            self.face.color = self.snapshot.aqi_color
         self.face.reset_color()
-        try:
-            AQI_CATEGORIES = ['Good', 'Moderate', 'Unhealthy for Sensitive Groups', 'NOT USED', 'Unhealthy', 'Very Unhealthy', 'Hazardous']
-            idx = AQI_CATEGORIES.index(self.datajson['Current AQI PM 2.5 category'])
-            self.face.mouth.emotion = Emotion.HAPPY_3 - idx
-        except ValueError as e:
-            print(f'{e}')
-            self.face.mouth.emotion = Emotion.NEUTRAL
+        self.face.mouth.emotion = Emotion.NEUTRAL
+        if self.snapshot.aqi_category is not None:
+            self.face.mouth.emotion = Emotion.HAPPY_3 - self.snapshot.aqi_category
 
     def make_face_wind(self):
-        mph = clamp(0, round(float(self.datajson['Wind'].split(' ')[0])) // 10, 3)
+        if self.snapshot.wind_speed is None:
+            return
+        mph = clamp(0, round(self.snapshot.wind_speed) // 10, 3)
         self.face.eyebrows[0].angle = 15 * mph
         self.face.eyebrows[1].angle = -15 * mph
 
+    def make_face_trend(self):
+        trend = self.temperature_trend()
+        for i in range(len(self.face.eyes)):
+            self.face.pupils[i].y = self.face.eyes[i].y - trend * (self.face.eyes[i].radius // 3)
+
     def make_face(self):
         self.face.reset_pupils()
         self.face.reset_eyebrows()
-        if self.datajson is not None:
+        if self.snapshot is not None:
             self.make_face_aqi()
             self.make_face_temp()
             self.make_face_wind()
+            self.make_face_trend()
             self.make_face_humid()
 
     def make_face_group(self):
-        self.face_group = displayio.Group()
+        '''Draws the face the first time. After that, the face is tweened to
+        the new weather a frame at a time by draw().'''
+        pose = None
+        if self.face_group is not None:
+            pose = Pose(self.face)
         self.make_face()
-        self.face.draw(self.face_group)
+        if pose is None:
+            self.face_group = self.face.render()
+            print(f'WEATHER: {self.face.changed} face features changed')
+        else:
+            self.animator.start(pose)
+        self.mark_stale()
+
+    def mark_stale(self):
+        '''Shows or hides the label on the face that says it's saved data.'''
+        if self.stale and self.stale_label is None:
+            self.stale_label = make_stale_label(self.face.diameter)
+            self.face_group.append(self.stale_label)
+        elif not self.stale and self.stale_label is not None:
+            self.face_group.remove(self.stale_label)
+            self.stale_label = None
 
     #####################################################
     def make_text_view_group(self):
         '''Creates a displayio.Group that shows the weather data as a bunch of text.'''
         group = displayio.Group()
-        BASE_FONT_SIZE = 24
-        font = bitmap_font.load_font(f"Junction-Regular-{BASE_FONT_SIZE}.pcf", displayio.Bitmap)
         font_scale = 1
         color = 0x0000FF
-        text = [f"{self.datajson['date']}",
-                f"Temp: {self.datajson['Outside Temperature'].split('&')[0]} deg",
-                f"Humidity: {self.datajson['Humidity']}",
-                f"Rain: {self.datajson['Rain']}",
-                f"Wind: {self.datajson['Wind']}",
-                f"UV: {self.datajson['UV Index']}",
-                f"Radiation: {self.datajson['Radiation'].split('&')[0]}^2",
-                f"AQI PM 2.5: {self.datajson['Current AQI PM 2.5']}"]
+        snapshot = self.snapshot
+        text = []
+        if self.stale:
+            text.append(STALE_TEXT)
+        if snapshot.date is not None:
+            text.append(str(snapshot.date))
+        if snapshot.temperature is not None:
+            trend = ['', ' rising', ' falling'][self.temperature_trend()]
+            text.append(f'Temp: {snapshot.temperature} deg{trend}')
+        if snapshot.humidity is not None:
+            text.append(f'Humidity: {round(snapshot.humidity)}%')
+        if snapshot.rain is not None:
+            text.append(f'Rain: {snapshot.rain:.2f} in')
+        if snapshot.wind_speed is not None:
+            wind = f'Wind: {round(snapshot.wind_speed)} mph'
+            if snapshot.wind_direction is not None:
+                wind = f'{wind} {snapshot.wind_direction}'
+            text.append(wind)
+        if snapshot.uv is not None:
+            text.append(f'UV: {snapshot.uv}')
+        if snapshot.radiation is not None:
+            text.append(f'Radiation: {round(snapshot.radiation)} W/m^2')
+        if snapshot.aqi is not None:
+            text.append(f'AQI PM 2.5: {snapshot.aqi}')
         text_areas = []
         down = 0
         for t in text:
-            text_area = label.Label(font, text=t, color=color, scale=font_scale)
-            text_area.x = 100
-            text_area.y = 100 + down
+            text_area = make_label(t, color, 100, 100 + down, font_scale)
             down += BASE_FONT_SIZE * (font_scale + 1)
             text_areas.append(text_area)
             group.append(text_area)
 
         self.text_group = group
 
-    def make_simple_text(text):
-        '''Creates a displayio.Group that shows a simple line of text.'''
+    #####################################################
+    def add_to_history(self, timestamp):
+        snapshot = self.snapshot
+        self.history.add(timestamp, [snapshot.temperature, snapshot.humidity, snapshot.wind_speed, snapshot.aqi])
+        self.history_group = None
+
+    def temperature_trend(self):
+        '''1 if it's been warming up, -1 if it's been cooling off, otherwise 0.'''
+        change = self.history.change('temperature', TREND_SECONDS)
+        if change is None:
+            return 0
+        if change >= TREND_DEGREES:
+            return 1
+        if change <= -TREND_DEGREES:
+            return -1
+        return 0
+
+    def make_history_group(self):
+        '''Creates a displayio.Group with a sparkline of the last day of each
+        history column. The lines are all drawn into one bitmap, which is
+        kept and redrawn.'''
+        if self.history_bitmap is None:
+            self.history_bitmap = displayio.Bitmap(SPARKLINE_WIDTH, SPARKLINE_SPACING * len(HISTORY_COLUMNS), len(HISTORY_COLUMNS) + 1)
+            self.history_palette = displayio.Palette(len(HISTORY_COLUMNS) + 1)
+            self.history_palette.make_transparent(0)
+            for (i, color) in enumerate(HISTORY_COLORS):
+                self.history_palette[i + 1] = color
+        self.history_bitmap.fill(0)
+
+        left = (self.face.diameter - SPARKLINE_WIDTH) // 2
+        top = (self.face.diameter - SPARKLINE_SPACING * len(HISTORY_COLUMNS)) // 2
         group = displayio.Group()
-        BASE_FONT_SIZE = 24
-        font = bitmap_font.load_font(f"Junction-Regular-{BASE_FONT_SIZE}.pcf", displayio.Bitmap)
-        font_scale = 1
-        color = 0xFF0000
-        text_area = label.Label(font, text=text, color=color, scale=font_scale)
-        text_area.x = 100
-        text_area.y = 100
-        group.append(text_area)
-        self.text_group = group
+        group.append(displayio.TileGrid(self.history_bitmap, pixel_shader=self.history_palette, x=left, y=top))
+        now = self.history.latest_time()
+        for (i, name) in enumerate(HISTORY_COLUMNS):
+            line_top = i * SPARKLINE_SPACING + BASE_FONT_SIZE // 2
+            value_range = None
+            if now is not None:
+                value_range = draw_sparkline(self.history_bitmap, self.history, name,
+                        line_top, SPARKLINE_HEIGHT, now - HISTORY_SECONDS, now, i + 1)
+            text = f'{HISTORY_LABELS[i]}: no data'
+            if value_range is not None:
+                text = f'{HISTORY_LABELS[i]}: {round(value_range[0])} to {round(value_range[1])}'
+            group.append(make_label(text, HISTORY_COLORS[i], left, top + line_top - BASE_FONT_SIZE // 2))
+        self.history_group = group
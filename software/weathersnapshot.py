@@ -0,0 +1,148 @@
+# Guy
+# weathersnapshot.py
+# Copyright 2025, Jonathan Koren
+# Licensed under the Gnu Public License v3
+#
+# The weather as numbers, parsed once per fetch. WeeWx can be set up to send
+# either formatted strings like "63.6&#176;F" (see weather-example.json) or
+# its raw observations like "outTemp": 63.6, and either is accepted. A field
+# that is missing or can't be read is None, and only the part of the face or
+# text that uses it is left out.
+
+from scale import bin_cutoff
+
+# Formatted name, then the WeeWx observation name
+TEMPERATURE = ('Outside Temperature', 'outTemp')
+WIND_CHILL = ('Wind Chill', 'windchill')
+HEAT_INDEX = ('Heat Index', 'heatindex')
+HUMIDITY = ('Humidity', 'outHumidity')
+WIND = ('Wind', 'windSpeed')
+WIND_DIRECTION = (None, 'windDir')
+RAIN = ('Rain', 'rain')
+UV = ('UV Index', 'UV')
+RADIATION = ('Radiation', 'radiation')
+AQI = ('Current AQI PM 2.5', 'pm2_5_aqi')
+AQI_COLOR = ('Current AQI PM 2.5 color', 'pm2_5_aqi_color')
+AQI_CATEGORY = ('Current AQI PM 2.5 category', 'pm2_5_aqi_category')
+
+# Index of the category is how unhappy the mouth is, which is why one is skipped.
+AQI_CATEGORIES = ['Good', 'Moderate', 'Unhealthy for Sensitive Groups', 'NOT USED', 'Unhealthy', 'Very Unhealthy', 'Hazardous']
+# Used when only the AQI itself was sent. The lowest AQI of each category,
+# its index in AQI_CATEGORIES, and its EPA color.
+AQI_BINS = [0, 51, 101, 151, 201, 301]
+AQI_BIN_CATEGORIES = [0, 1, 2, 4, 5, 6]
+AQI_BIN_COLORS = [0x00e400, 0xffff00, 0xff7e00, 0xff0000, 0x8f3f97, 0x7e0023]
+
+NUMBER_CHARS = '0123456789.-+'
+
+def leading_number(value):
+    '''The number at the start of a formatted value, e.g. 63.6 from
+    "63.6&#176;F", or the value itself if it's already a number. None if there
+    isn't one.'''
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    end = 0
+    while end < len(text) and text[end] in NUMBER_CHARS:
+        end += 1
+    try:
+        return float(text[:end])
+    except ValueError:
+        return None
+
+def lookup(datajson, names):
+    '''The value of the first of `names` that's in the data.'''
+    for name in names:
+        if name is not None and name in datajson:
+            return datajson[name]
+    return None
+
+class WeatherSnapshot:
+    '''Temperatures are in degrees F, wind in mph, and rain in inches, the
+    same as the strings WeeWx formats. Every field can be None.'''
+    __slots__ = ('date', 'temperature', 'wind_chill', 'heat_index', 'humidity',
+                 'wind_speed', 'wind_direction', 'rain', 'uv', 'radiation',
+                 'aqi', 'aqi_color', 'aqi_category')
+
+    def __init__(self, datajson):
+        self.date = datajson.get('date')
+        self.temperature = self.number(datajson, TEMPERATURE)
+        self.wind_chill = self.number(datajson, WIND_CHILL)
+        self.heat_index = self.number(datajson, HEAT_INDEX)
+        self.humidity = self.number(datajson, HUMIDITY)
+        self.wind_speed = self.number(datajson, WIND)
+        self.wind_direction = self.parse_wind_direction(datajson)
+        self.rain = self.number(datajson, RAIN)
+        self.uv = self.number(datajson, UV)
+        self.radiation = self.number(datajson, RADIATION)
+        self.aqi = self.number(datajson, AQI)
+        if self.aqi is not None:
+            self.aqi = round(self.aqi)
+        self.aqi_color = self.parse_aqi_color(datajson)
+        self.aqi_category = self.parse_aqi_category(datajson)
+
+    def number(self, datajson, names):
+        value = lookup(datajson, names)
+        number = leading_number(value)
+        if number is None and value is not None:
+            print(f'WEATHER: could not read {names[0]}: {repr(value)}')
+        return number
+
+    def parse_wind_direction(self, datajson):
+        '''"from N" out of "0 mph from N", or the compass degrees.'''
+        value = lookup(datajson, WIND_DIRECTION)
+        if value is not None:
+            degrees = leading_number(value)
+            if degrees is not None:
+                return f'from {round(degrees)} deg'
+        wind = datajson.get(WIND[0])
+        if isinstance(wind, str) and 'from' in wind:
+            direction = wind[wind.index('from') + len('from'):].strip()
+            if len(direction) > 0 and direction != 'N/A':
+                return f'from {direction}'
+        return None
+
+    def aqi_bin(self):
+        if self.aqi is None:
+            return None
+        return max(0, bin_cutoff(self.aqi, AQI_BINS))
+
+    def parse_aqi_color(self, datajson):
+        value = lookup(datajson, AQI_COLOR)
+        try:
+            if isinstance(value, str) and value.startswith('#'):
+                return int(value[1:], 16)
+        except ValueError:
+            pass
+        if value is not None:
+            print(f'WEATHER: could not read {AQI_COLOR[0]}: {repr(value)}')
+        b = self.aqi_bin()
+        if b is None:
+            return None
+        return AQI_BIN_COLORS[b]
+
+    def parse_aqi_category(self, datajson):
+        '''Index into AQI_CATEGORIES.'''
+        value = lookup(datajson, AQI_CATEGORY)
+        if value in AQI_CATEGORIES:
+            return AQI_CATEGORIES.index(value)
+        if value is not None:
+            print(f'WEATHER: could not read {AQI_CATEGORY[0]}: {repr(value)}')
+        b = self.aqi_bin()
+        if b is None:
+            return None
+        return AQI_BIN_CATEGORIES[b]
+
+    def feels_like(self):
+        '''The wind chill or heat index if either is far enough from the air
+        temperature to matter, otherwise the air temperature. Whole degrees.'''
+        if self.temperature is None:
+            return None
+        airtemp = round(self.temperature)
+        if self.wind_chill is not None and round(self.wind_chill) < airtemp * 0.9:
+            return round(self.wind_chill)
+        if self.heat_index is not None and round(self.heat_index) > airtemp * 1.1:
+            return round(self.heat_index)
+        return airtemp
@@ -0,0 +1,64 @@
+# Guy
+# bench_faces.py
+# Copyright 2025, Jonathan Koren
+# Licensed under the Gnu Public License v3
+#
+# Draws a face for every emotion with raster.py and reports how long it takes,
+# how many shapes it makes, and how much of the display it covers. Needs
+# CPython and NumPy.
+#
+#   python tools/bench_faces.py --repeat 20
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'software'))
+
+from chernoff import Face, make_group
+from faceanimation import EMOTIONS
+from raster import Framebuffer, count_shapes
+
+EMOTION_NAMES = {
+    10: 'ANGRY', 3: 'HAPPY_3', 2: 'HAPPY_2', 1: 'HAPPY_1', 0: 'NEUTRAL',
+    -1: 'SAD_1', -2: 'SAD_2', -3: 'SAD_3', -4: 'SAD_4', -10: 'SCARED',
+    11: 'MISCHEVIOUS', -11: 'CONFUSED',
+}
+
+def bench(emotion, size, repeat):
+    '''Returns (ms to draw, ms to render, shape count, coverage).'''
+    face = Face(size)
+    face.emotion = emotion
+    if not face.is_complex_emotion():
+        face.reset_pupils()
+        face.reset_eyebrows()
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        group = make_group()
+        face.draw(group)
+    draw_ms = (time.perf_counter() - start) * 1000 / repeat
+
+    framebuffer = Framebuffer(size, size)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        framebuffer.clear()
+        framebuffer.render(group)
+    render_ms = (time.perf_counter() - start) * 1000 / repeat
+
+    return (draw_ms, render_ms, count_shapes(group), framebuffer.coverage())
+
+def main():
+    parser = argparse.ArgumentParser(description='Times drawing a face for every emotion.')
+    parser.add_argument('--size', type=int, default=480, help='display width and height')
+    parser.add_argument('--repeat', type=int, default=10, help='times to draw each face')
+    args = parser.parse_args()
+
+    print(f'{"emotion":12} {"draw ms":>8} {"render ms":>9} {"shapes":>6} {"coverage":>8}')
+    for emotion in EMOTIONS:
+        (draw_ms, render_ms, shapes, coverage) = bench(emotion, args.size, args.repeat)
+        print(f'{EMOTION_NAMES[emotion]:12} {draw_ms:8.2f} {render_ms:9.2f} {shapes:6} {100 * coverage:7.2f}%')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+# Guy
+# build_mpy.py
+# Copyright 2025, Jonathan Koren
+# Licensed under the Gnu Public License v3
+#
+# Compiles software/ to .mpy bytecode with mpy-cross, so the ESP32 doesn't
+# have to compile every module each time it boots. code.py and boot.py stay
+# .py, because CircuitPython only runs those by name, along with the fonts and
+# the .example files. The result is copied onto the CIRCUITPY drive as is.
+#
+# mpy-cross has to match the CircuitPython version on the board, e.g.
+# mpy-cross 9.x for CircuitPython 9. It's at
+# https://adafruit-circuit-python.s3.amazonaws.com/index.html?prefix=bin/mpy-cross/
+#
+#   python tools/build_mpy.py --mpy-cross ~/bin/mpy-cross --out build
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SOFTWARE = os.path.join(HERE, '..', 'software')
+
+KEEP_AS_SOURCE = ('code.py', 'boot.py')
+HOST_ONLY = ('raster.py',) # NumPy stand-in for displayio, see chernoff.py
+DATA = ('.pcf', '.example')
+
+def main():
+    parser = argparse.ArgumentParser(description='Compiles software/ to .mpy files.')
+    parser.add_argument('--mpy-cross', default='mpy-cross', help='path to mpy-cross')
+    parser.add_argument('--out', default='build', help='directory to write to')
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    source_bytes = 0
+    built_bytes = 0
+    for name in sorted(os.listdir(SOFTWARE)):
+        path = os.path.join(SOFTWARE, name)
+        if name in HOST_ONLY or not os.path.isfile(path):
+            continue
+        if name in KEEP_AS_SOURCE or name.endswith(DATA):
+            shutil.copy(path, os.path.join(args.out, name))
+            continue
+        if not name.endswith('.py'):
+            continue
+        out = os.path.join(args.out, name[:-3] + '.mpy')
+        result = subprocess.run([args.mpy_cross, '-o', out, path], capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f'{name}: {result.stderr.strip()}')
+            sys.exit(1)
+        source_bytes += os.path.getsize(path)
+        built_bytes += os.path.getsize(out)
+        print(f'{name} -> {os.path.basename(out)} {os.path.getsize(out)} bytes')
+    print(f'{source_bytes} bytes of source, {built_bytes} bytes of bytecode in {args.out}')
+
+if __name__ == '__main__':
+    main()
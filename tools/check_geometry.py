@@ -0,0 +1,132 @@
+# Guy
+# check_geometry.py
+# Copyright 2025, Jonathan Koren
+# Licensed under the Gnu Public License v3
+#
+# Checks that geometry.py gives the same points as the float math it replaced,
+# for every eyebrow, pupil, and mouth the face can make and then some, and
+# times both, on their own and in Face.render() for every emotion.
+#
+#   python tools/check_geometry.py
+
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'software'))
+
+import geometry
+
+def rotate_float(x, y, angle):
+    '''EyeBrow._rotate() before geometry.py'''
+    return (round((x * math.cos(math.radians(angle))) - (y * math.sin(math.radians(angle)))),
+            round((x * math.sin(math.radians(angle))) + (y * math.cos(math.radians(angle)))))
+
+def arc_points_float(radius, angle, direction, segments, arc_width):
+    '''adafruit_display_shapes.arc.Arc._init_arc()'''
+    direction = direction - angle / 2
+    points = []
+    for i in range(segments + 1):
+        alpha = (i * angle / segments + direction) / 180 * math.pi
+        points.append((int(radius * math.cos(alpha)), -int(radius * math.sin(alpha))))
+    if arc_width > 1:
+        for i in range(segments, -1, -1):
+            alpha = (i * angle / segments + direction) / 180 * math.pi
+            points.append((int((radius - arc_width) * math.cos(alpha)), -int((radius - arc_width) * math.sin(alpha))))
+    return points
+
+def bound_float(eye_radius, pupil_radius, dx, dy):
+    '''bound_pupil_to_eye() before geometry.py, with the eye at 0, 0.
+    Returns where the pupil ends up.'''
+    px = dx
+    py = dy
+    dist_pupil_edge = math.sqrt(px ** 2 + py ** 2) + pupil_radius
+    if dist_pupil_edge > eye_radius:
+        overage = dist_pupil_edge - eye_radius
+        angle = math.pi / 2
+        if px > 0:
+            angle = math.atan(py / px)
+            px -= round(math.cos(angle) * overage)
+        elif px != 0:
+            angle = math.atan(py / -px)
+            px += round(math.cos(angle) * overage)
+        py -= round(math.sin(angle) * overage)
+    return (px, py)
+
+def bound_fixed(eye_radius, pupil_radius, dx, dy):
+    (move_x, move_y) = geometry.pull_in(dx, dy, eye_radius, pupil_radius)
+    return (dx - move_x, dy - move_y)
+
+def check(name, cases, new, old):
+    mismatches = 0
+    start = time.perf_counter()
+    for case in cases:
+        new(*case)
+    new_s = time.perf_counter() - start
+    start = time.perf_counter()
+    for case in cases:
+        old(*case)
+    old_s = time.perf_counter() - start
+    for case in cases:
+        if new(*case) != old(*case):
+            mismatches += 1
+            if mismatches <= 5:
+                print(f'  {name}{case}: {new(*case)} != {old(*case)}')
+    print(f'{name}: {len(cases)} cases, {mismatches} different, '
+          f'{1e6 * new_s / len(cases):.2f} us vs {1e6 * old_s / len(cases):.2f} us with floats')
+    return mismatches
+
+def time_renders(repeat=100):
+    '''Milliseconds per Face.render() over every emotion, with a pupil pushed
+    out of its eye each time so bound_pupil_to_eye() has work to do.'''
+    import chernoff
+    from faceanimation import EMOTIONS
+    face = chernoff.Face(480)
+    face.draw(chernoff.make_group())
+    for emotion in EMOTIONS:
+        face.emotion = emotion
+        face.render()
+    renders = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for emotion in EMOTIONS:
+            face.emotion = emotion
+            face.pupils[0].x += 7
+            face.render()
+            renders += 1
+    return 1000 * (time.perf_counter() - start) / renders
+
+def check_renders():
+    import chernoff
+    fixed_ms = time_renders()
+    (rotate, arc_points, pull_in) = (chernoff.rotate, chernoff.arc_points, chernoff.pull_in)
+    chernoff.rotate = rotate_float
+    chernoff.arc_points = arc_points_float
+    chernoff.pull_in = lambda dx, dy, outer, inner: tuple(
+        a - b for (a, b) in zip((dx, dy), bound_float(outer, inner, dx, dy)))
+    chernoff._arc_points.clear()
+    float_ms = time_renders()
+    (chernoff.rotate, chernoff.arc_points, chernoff.pull_in) = (rotate, arc_points, pull_in)
+    chernoff._arc_points.clear()
+    print(f'Face.render: {fixed_ms:.3f} ms vs {float_ms:.3f} ms with floats')
+
+def main():
+    rotations = [(x, y, angle) for angle in range(-30, 31)
+                 for x in range(-120, 121) for y in range(-30, 31)]
+    arcs = [(radius, angle, direction, segments, 2 * stroke)
+            for radius in (100, 200, 400) for angle in (30, 60, 120) for direction in (90, 270)
+            for stroke in range(1, 11) for segments in range(1, angle + 1) if angle % segments == 0]
+    pupils = [(eye_radius, pupil_radius, dx, dy) for eye_radius in range(10, 61, 5)
+              for pupil_radius in range(1, eye_radius + 1, 3)
+              for dx in range(-2 * eye_radius, 2 * eye_radius + 1, 2)
+              for dy in range(-2 * eye_radius, 2 * eye_radius + 1, 2)]
+
+    mismatches = check('rotate', rotations, geometry.rotate, rotate_float)
+    mismatches += check('arc_points', arcs, geometry.arc_points, arc_points_float)
+    mismatches += check('bound_pupil_to_eye', pupils, bound_fixed, bound_float)
+    check_renders()
+    sys.exit(1 if mismatches > 0 else 0)
+
+if __name__ == '__main__':
+    main()
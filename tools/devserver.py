@@ -0,0 +1,141 @@
+# Guy
+# devserver.py
+# Copyright 2025, Jonathan Koren
+# Licensed under the Gnu Public License v3
+#
+# A stand-in for WeeWx and OpenSky, for running the modules on a computer
+# instead of the ESP32. Point WEATHER_URL at http://localhost:8000/weewx/current.json
+# and OPENSKY_URL at http://localhost:8000 .
+
+import argparse
+import gzip
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+WEATHER_EXAMPLE = os.path.join(HERE, '..', 'software', 'weather-example.json')
+
+AIRLINES = ['UAL', 'SWA', 'AAL', 'DAL', 'ASA', 'SKW', 'FDX', 'N']
+METERS_PER_DEGREE = 111320
+
+def make_weather(period):
+    '''The weather only changes every `period` seconds, like a real station.'''
+    with open(WEATHER_EXAMPLE) as f:
+        weather = json.load(f)
+    now = int(time.time()) // period * period
+    weather['date'] = time.strftime('%a, %d %b %Y %H:%M:%S', time.localtime(now))
+    weather['Humidity'] = f'{random.Random(now).randint(0, 100)}%'
+    return weather
+
+def make_states(query, count, lifetime):
+    '''Makes up `count` aircraft inside the query's bounding box, in the same
+    shape as OpenSky's /api/states/all. Each flies in a straight line for
+    `lifetime` seconds and is then replaced by a new one, at staggered times,
+    so the traffic changes a little from poll to poll.'''
+    lat_min = float(query.get('lamin', ['36.785'])[0])
+    lat_max = float(query.get('lamax', ['38.761'])[0])
+    long_min = float(query.get('lomin', ['-123.646'])[0])
+    long_max = float(query.get('lomax', ['-120.578'])[0])
+    now = int(time.time())
+    states = []
+    for i in range(count):
+        offset = i * lifetime // count
+        generation = (now + offset) // lifetime
+        flying = now + offset - generation * lifetime
+        r = random.Random(f'{i} {generation}')
+        callsign = f'{r.choice(AIRLINES)}{r.randint(1, 9999)}'.ljust(8)
+        velocity = r.uniform(50, 250)
+        track = r.uniform(0, 360)
+        lat = r.uniform(lat_min, lat_max)
+        north = velocity * math.cos(math.radians(track)) * flying
+        east = velocity * math.sin(math.radians(track)) * flying
+        lat += north / METERS_PER_DEGREE
+        long = r.uniform(long_min, long_max) + east / (METERS_PER_DEGREE * math.cos(math.radians(lat)))
+        states.append([f'{i:03x}{generation % 4096:03x}', callsign, 'United States', now, now,
+            long, lat, r.uniform(0, 12000), False, velocity,
+            track, r.uniform(-10, 10), None,
+            r.uniform(0, 12000), '1200', False, 0, 0])
+    return {'time': now, 'states': states}
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.endswith('/current.json'):
+            body = make_weather(self.server.weather_period)
+        elif url.path == '/api/states/all':
+            if self.rate_limited():
+                return
+            body = make_states(parse_qs(url.query), self.server.aircraft, self.server.lifetime)
+        else:
+            self.send_error(404)
+            return
+
+        data = json.dumps(body).encode('utf-8')
+        etag = '"' + hashlib.sha1(data).hexdigest() + '"'
+        time.sleep(self.server.delay)
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('ETag', etag)
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            data = gzip.compress(data)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        # dribble the body out so that slow networks can be imitated
+        for i in range(0, len(data), 1024):
+            self.wfile.write(data[i:i + 1024])
+            time.sleep(self.server.byte_delay * 1024)
+
+    def rate_limited(self):
+        '''Answers 429, the way OpenSky does, if the last request was less
+        than --rate-limit seconds ago.'''
+        with self.server.lock:
+            now = time.time()
+            wait = self.server.last_states + self.server.rate_limit - now
+            if wait <= 0:
+                self.server.last_states = now
+                return False
+        self.send_response(429)
+        self.send_header('X-Rate-Limit-Retry-After-Seconds', str(math.ceil(wait)))
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+        return True
+
+def main():
+    parser = argparse.ArgumentParser(description='Stand-in for WeeWx and OpenSky.')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--aircraft', type=int, default=50, help='aircraft per response')
+    parser.add_argument('--delay', type=float, default=0, help='seconds before each response')
+    parser.add_argument('--byte-delay', type=float, default=0, help='seconds per byte of each response')
+    parser.add_argument('--weather-period', type=int, default=300, help='seconds between weather changes')
+    parser.add_argument('--lifetime', type=int, default=600, help='seconds each aircraft flies before it is replaced')
+    parser.add_argument('--rate-limit', type=float, default=0, help='least seconds between aircraft requests, or 429')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('', args.port), Handler)
+    server.aircraft = args.aircraft
+    server.delay = args.delay
+    server.byte_delay = args.byte_delay
+    server.weather_period = args.weather_period
+    server.lifetime = args.lifetime
+    server.rate_limit = args.rate_limit
+    server.last_states = 0
+    server.lock = threading.Lock()
+    print(f'Serving on port {args.port}')
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# Guy
+# host.py
+# Copyright 2025, Jonathan Koren
+# Licensed under the Gnu Public License v3
+#
+# Runs Guy's main loop on a computer against devserver.py. Needs CPython with
+# requests, adafruit-blinka-displayio, and the adafruit_display_shapes,
+# adafruit_display_text, and adafruit_bitmap_font libraries installed.
+#
+#   python tools/devserver.py --delay 2 &
+#   python tools/host.py --swipe 5
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SOFTWARE = os.path.join(HERE, '..', 'software')
+sys.path.insert(0, SOFTWARE)
+os.chdir(SOFTWARE) # fonts are loaded from the current directory
+
+import requests
+
+import boottime
+import flashcache
+from mainloop import MainLoop
+from registry import load_modules
+
+class HostDisplay:
+    def __init__(self, width):
+        self.width = width
+        self.auto_refresh = True
+        self._root_group = None
+        self.refreshes = 0
+
+    @property
+    def root_group(self):
+        return self._root_group
+
+    @root_group.setter
+    def root_group(self, group):
+        if group is not self._root_group:
+            print(f'HOST: showing {type(group).__name__} at {time.monotonic():.3f}')
+        self._root_group = group
+
+    def refresh(self, target_frames_per_second=None, minimum_frames_per_second=0):
+        self.refreshes += 1
+        return True
+
+class ScriptedTouch:
+    '''Swipes right every `interval` seconds.'''
+    def __init__(self, width, interval):
+        self.width = width
+        self.interval = interval
+        self.next_swipe = None
+        if interval is not None:
+            self.next_swipe = time.monotonic() + interval
+
+    @property
+    def touched(self):
+        return self.next_swipe is not None and time.monotonic() >= self.next_swipe
+
+    @property
+    def touches(self):
+        if not self.touched:
+            return []
+        self.next_swipe = time.monotonic() + self.interval
+        return [{'x': 0, 'y': self.width // 2}]
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs the main loop against devserver.py.')
+    parser.add_argument('--server', default='http://localhost:8000')
+    parser.add_argument('--size', type=int, default=480)
+    parser.add_argument('--swipe', type=float, default=None, help='seconds between swipes')
+    parser.add_argument('--modules', default=None, help='like GUY_MODULES in settings.toml')
+    parser.add_argument('--cache-dir', default=os.path.join(tempfile.gettempdir(), 'guy-cache'),
+                        help='where flashcache.py saves, instead of /cache')
+    args = parser.parse_args()
+    flashcache.CACHE_DIR = args.cache_dir
+
+    # what settings.toml would have
+    settings = {
+        'WEATHER_URL': f'{args.server}/weewx/current.json',
+        'OPENSKY_LAT_MIN': 36.785,
+        'OPENSKY_LAT_MAX': 38.761,
+        'OPENSKY_LONG_MIN': -123.646,
+        'OPENSKY_LONG_MAX': -120.578,
+        'OPENSKY_URL': args.server,
+    }
+    boottime.mark('imports')
+
+    session = requests.Session()
+    display = HostDisplay(args.size)
+    modules = load_modules(args.modules, args.size, session, settings.get)
+    asyncio.run(MainLoop(display, ScriptedTouch(args.size, args.swipe), modules).run())
+
+if __name__ == '__main__':
+    main()